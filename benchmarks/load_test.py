@@ -0,0 +1,363 @@
+"""
+load_test.py
+
+End-to-end load test for the FastAPI service (src/web/app.py).
+
+Generates a synthetic repo, starts a stub LLM server and the app under uvicorn
+in a scratch directory, indexes the repo, then drives `/query` from concurrent
+clients while optionally re-indexing in the background. Reports throughput,
+latency percentiles, error rates and server memory (RSS and PSS) over time as
+JSON; query latencies are also split by whether an `/index` was running at the
+time.
+
+Usage:
+    python benchmarks/load_test.py --concurrency 16 --duration 30
+    python benchmarks/load_test.py --workers 4 --shared-index --index-every 10 \
+        --llm-latency 0.5 --llm-error-rate 0.05 --out load.json
+"""
+
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+
+import requests
+
+sys.path.append(str(Path(__file__).parent))
+
+from stub_llm import start_stub_llm
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+WORDS = ("load parse save user order cache token session request response config "
+         "retry queue event stream batch index query graph node edge client server").split()
+
+QUERIES = [
+    "How does data loading work?",
+    "Where is the cache invalidated?",
+    "What calls the session handler?",
+    "Explain the retry logic for requests",
+    "Which functions parse config files?",
+    "How are events pushed to the queue?",
+]
+
+# -----------------------------------------------------------------------------
+# Fixtures: synthetic repo and server process
+# -----------------------------------------------------------------------------
+def generate_repo(root: Path, packages: int, files: int, functions: int, seed: int = 0):
+    """Python packages of functions that call each other, plus a README per package."""
+    rng = random.Random(seed)
+    names = [f"{rng.choice(WORDS)}_{rng.choice(WORDS)}_{p}_{f}_{i}"
+             for p in range(packages) for f in range(files) for i in range(functions)]
+    n = 0
+    for p in range(packages):
+        pkg = root / f"pkg{p}"
+        pkg.mkdir(parents=True)
+        (pkg / "__init__.py").write_text("")
+        (pkg / "README.md").write_text(f"# Package {p}\n\n" + " ".join(rng.choices(WORDS, k=200)) + "\n")
+        for f in range(files):
+            lines = []
+            for i in range(functions):
+                name = names[n]
+                n += 1
+                callees = rng.sample(names, 3)
+                lines.append(f"def {name}(data):")
+                lines.append(f'    """{" ".join(rng.choices(WORDS, k=12))}."""')
+                lines.extend(f"    data = {c}(data)" for c in callees)
+                lines.append("    return data\n")
+            (pkg / f"mod{f}.py").write_text("\n".join(lines))
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_app(workdir: Path, port: int, workers: int, env: Dict[str, str]) -> subprocess.Popen:
+    # The app serves static files from ./src/web/static and keeps index.json in cwd
+    (workdir / "src").symlink_to(REPO_ROOT / "src")
+    cmd = [sys.executable, "-m", "uvicorn", "web.app:app", "--host", "127.0.0.1",
+           "--port", str(port), "--workers", str(workers), "--log-level", "warning"]
+    full_env = {**os.environ, "PYTHONPATH": str(REPO_ROOT / "src"), **env}
+    log = open(workdir / "server.log", "w")
+    return subprocess.Popen(cmd, cwd=workdir, env=full_env, stdout=log, stderr=subprocess.STDOUT)
+
+def wait_until_up(base_url: str, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(base_url + "/", timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not start within {timeout}s")
+
+def _proc_field(path: str, field: str) -> Optional[int]:
+    """A `<field>: <n> kB` value from a /proc file, in bytes."""
+    try:
+        text = Path(path).read_text()
+    except OSError:
+        return None
+    for line in text.splitlines():
+        if line.startswith(field + ":"):
+            return int(line.split()[1]) * 1024
+    return None
+
+def process_tree_memory(pid: int) -> Dict[str, Optional[int]]:
+    """
+    Memory of `pid` and its descendants (Linux /proc). `rss_bytes` sums VmRSS,
+    which counts pages shared between workers (the memory-mapped index) once
+    per process; `pss_bytes` sums Pss from smaps_rollup, which splits each
+    shared page between the processes mapping it, so it is the real total.
+    """
+    def children(p: int) -> List[int]:
+        kids = []
+        for task in Path(f"/proc/{p}/task").glob("*"):
+            try:
+                kids += [int(c) for c in (task / "children").read_text().split()]
+            except OSError:
+                pass
+        return kids
+
+    if not Path(f"/proc/{pid}/status").exists():
+        return {"rss_bytes": None, "pss_bytes": None}
+    rss, pss, stack, seen = 0, 0, [pid], set()
+    while stack:
+        p = stack.pop()
+        if p in seen:
+            continue
+        seen.add(p)
+        p_rss = _proc_field(f"/proc/{p}/status", "VmRSS")
+        if p_rss is None:
+            continue  # exited while we were walking the tree
+        rss += p_rss
+        p_pss = _proc_field(f"/proc/{p}/smaps_rollup", "Pss")
+        # Kernels before 4.14 have no smaps_rollup
+        pss = None if pss is None or p_pss is None else pss + p_pss
+        stack += children(p)
+    return {"rss_bytes": rss, "pss_bytes": pss}
+
+# -----------------------------------------------------------------------------
+# Load drivers
+# -----------------------------------------------------------------------------
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples: List[Dict[str, Any]] = []
+        self.index_running = threading.Event()
+        self.index_seconds = 0.0
+
+    def record(self, op: str, start: float, latency: float, ok: bool, status: Optional[int],
+               during_index: bool):
+        with self.lock:
+            self.samples.append({"op": op, "t": start, "latency": latency, "ok": ok, "status": status,
+                                 "during_index": during_index or self.index_running.is_set()})
+
+def timed_request(session: requests.Session, recorder: Recorder, op: str, method: str, url: str, **kwargs):
+    during_index = recorder.index_running.is_set()
+    start = time.monotonic()
+    status = None
+    try:
+        resp = session.request(method, url, **kwargs)
+        status = resp.status_code
+        ok = resp.ok
+    except requests.RequestException:
+        ok = False
+    recorder.record(op, start, time.monotonic() - start, ok, status, during_index)
+
+def query_worker(base_url: str, recorder: Recorder, stop: threading.Event, k: int,
+                 scoped_ratio: float, packages: int, seed: int):
+    rng = random.Random(seed)
+    session = requests.Session()
+    while not stop.is_set():
+        body = {"question": rng.choice(QUERIES), "k": k}
+        op = "query"
+        if rng.random() < scoped_ratio:
+            body.update(path=f"pkg{rng.randrange(packages)}", kind=["function"])
+            op = "query_scoped"
+        timed_request(session, recorder, op, "POST", base_url + "/query", json=body, timeout=120)
+
+def index_worker(base_url: str, repo: Path, recorder: Recorder, stop: threading.Event, every: float):
+    session = requests.Session()
+    while not stop.wait(every):
+        recorder.index_running.set()
+        start = time.monotonic()
+        try:
+            timed_request(session, recorder, "index", "POST", base_url + "/index",
+                          params={"repo_path": str(repo)}, timeout=600)
+        finally:
+            recorder.index_running.clear()
+            recorder.index_seconds += time.monotonic() - start
+
+def memory_sampler(pid: int, t0: float, out: List[Dict[str, Any]], stop: threading.Event, interval: float):
+    while True:
+        out.append({"t": round(time.monotonic() - t0, 2), **process_tree_memory(pid)})
+        if stop.wait(interval):
+            return
+
+# -----------------------------------------------------------------------------
+# Reporting
+# -----------------------------------------------------------------------------
+def percentile(ordered: List[float], q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def summarize(samples: List[Dict[str, Any]], duration: float) -> Dict[str, Any]:
+    if not samples:
+        return {"requests": 0}
+    latencies = sorted(s["latency"] for s in samples)
+    errors = sum(not s["ok"] for s in samples)
+    return {
+        "requests": len(samples),
+        "duration_s": round(duration, 2),
+        "throughput_rps": round(len(samples) / duration, 2) if duration > 0 else None,
+        "error_rate": round(errors / len(samples), 4),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.50) * 1000, 1),
+            "p95": round(percentile(latencies, 0.95) * 1000, 1),
+            "p99": round(percentile(latencies, 0.99) * 1000, 1),
+            "max": round(latencies[-1] * 1000, 1),
+        },
+    }
+
+def timeline(samples: List[Dict[str, Any]], t0: float, bucket: float) -> List[Dict[str, Any]]:
+    buckets: Dict[int, List[Dict[str, Any]]] = {}
+    for s in samples:
+        buckets.setdefault(int((s["t"] - t0) // bucket), []).append(s)
+    return [{"t": round(b * bucket, 2), **summarize(items, bucket)} for b, items in sorted(buckets.items())]
+
+# -----------------------------------------------------------------------------
+# Main
+# -----------------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Load test the CodeLens QA web service")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent /query clients")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds of load after warm-up")
+    parser.add_argument("--k", type=int, default=5, help="Top K results per query")
+    parser.add_argument("--scoped-ratio", type=float, default=0.0,
+                        help="Fraction of queries scoped to one package and kind=function")
+    parser.add_argument("--index-every", type=float, default=0.0,
+                        help="Re-index the repo every N seconds during the run (0 = never)")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--shared-index", action="store_true", help="Serve from a shared memory-mapped index")
+    parser.add_argument("--packages", type=int, default=10, help="Synthetic repo: packages")
+    parser.add_argument("--files", type=int, default=10, help="Synthetic repo: files per package")
+    parser.add_argument("--functions", type=int, default=20, help="Synthetic repo: functions per file")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Stub LLM seconds per answer")
+    parser.add_argument("--llm-jitter", type=float, default=0.0, help="Stub LLM +/- jitter seconds")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="Stub LLM fraction of 503s")
+    parser.add_argument("--offline", action="store_true", help="Skip the stub LLM; use offline analysis")
+    parser.add_argument("--bucket", type=float, default=5.0, help="Seconds per timeline bucket")
+    parser.add_argument("--out", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+    # Without a shared index each worker holds its own copy and /index only
+    # reaches one of them, so the others would keep answering from the old one
+    per_worker_index = args.workers > 1 and not args.shared_index
+    if per_worker_index and args.index_every > 0:
+        parser.error("--index-every with --workers > 1 needs --shared-index")
+
+    with tempfile.TemporaryDirectory(prefix="codelens-load-") as tmp:
+        tmp = Path(tmp)
+        repo, workdir = tmp / "repo", tmp / "server"
+        workdir.mkdir()
+        generate_repo(repo, args.packages, args.files, args.functions)
+
+        env = {"LLM_PROVIDER": "none"}
+        if not args.offline:
+            stub, stub_url = start_stub_llm(args.llm_latency, args.llm_jitter, args.llm_error_rate)
+            env = {"LLM_PROVIDER": "huggingface", "HUGGINGFACE_API_KEY": "stub",
+                   "HUGGINGFACE_API_URL": stub_url}
+        if args.shared_index:
+            env["CODELENS_SHARED_INDEX"] = str(tmp / "shared-index")
+
+        initial_index = None
+        if per_worker_index:
+            # Every worker loads ./index.json on startup
+            t = time.monotonic()
+            subprocess.run([sys.executable, "-m", "codelens.cli", "index", "--repo", str(repo),
+                            "--out", str(workdir / "index.json")],
+                           env={**os.environ, "PYTHONPATH": str(REPO_ROOT / "src")},
+                           check=True, capture_output=True)
+            units = json.loads((workdir / "index.json").read_text())
+            initial_index = {"units": len(units), "seconds": round(time.monotonic() - t, 2), "via": "cli"}
+
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        server = start_app(workdir, port, args.workers, env)
+        try:
+            wait_until_up(base_url)
+
+            if initial_index is None:
+                t = time.monotonic()
+                resp = requests.post(base_url + "/index", params={"repo_path": str(repo)}, timeout=600)
+                resp.raise_for_status()
+                initial_index = {"units": resp.json()["count"], "seconds": round(time.monotonic() - t, 2),
+                                 "via": "/index"}
+            # Warm every worker so the first measured queries do not pay for attach/imports,
+            # and stop here rather than measure a server that cannot answer
+            for _ in range(args.workers * 2):
+                resp = requests.post(base_url + "/query", json={"question": QUERIES[0]}, timeout=120)
+                if resp.status_code != 200:
+                    log = (workdir / "server.log").read_text()[-2000:]
+                    raise RuntimeError(f"Warm-up query failed with {resp.status_code}: {resp.text}\n{log}")
+
+            recorder, stop = Recorder(), threading.Event()
+            memory: List[Dict[str, Any]] = []
+            t0 = time.monotonic()
+            threads = [threading.Thread(target=memory_sampler, args=(server.pid, t0, memory, stop, 1.0))]
+            threads += [threading.Thread(target=query_worker,
+                                         args=(base_url, recorder, stop, args.k, args.scoped_ratio,
+                                               args.packages, i))
+                        for i in range(args.concurrency)]
+            if args.index_every > 0:
+                threads.append(threading.Thread(target=index_worker,
+                                                args=(base_url, repo, recorder, stop, args.index_every)))
+            for th in threads:
+                th.start()
+            time.sleep(args.duration)
+            stop.set()
+            for th in threads:
+                th.join()
+            elapsed = time.monotonic() - t0
+        finally:
+            server.terminate()
+            try:
+                server.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+        samples = recorder.samples
+        queries = [s for s in samples if s["op"].startswith("query")]
+        # The splits are rated over the time /index was (not) running, not the whole run
+        index_seconds = min(recorder.index_seconds, elapsed)
+        report = {
+            "config": vars(args),
+            "initial_index": initial_index,
+            "elapsed_s": round(elapsed, 2),
+            "query": summarize(queries, elapsed),
+            "query_by_op": {op: summarize([s for s in queries if s["op"] == op], elapsed)
+                            for op in sorted({s["op"] for s in queries})},
+            "query_during_index": summarize([s for s in queries if s["during_index"]], index_seconds),
+            "query_idle": summarize([s for s in queries if not s["during_index"]],
+                                    elapsed - index_seconds),
+            "index": summarize([s for s in samples if s["op"] == "index"], elapsed),
+            "status_codes": {str(code): sum(s["status"] == code for s in samples)
+                             for code in sorted({s["status"] for s in samples}, key=str)},
+            "timeline": timeline(queries, t0, args.bucket),
+            "memory": memory,
+        }
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text)
+        print(f"Report written to {args.out}")
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
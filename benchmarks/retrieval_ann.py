@@ -0,0 +1,125 @@
+"""
+retrieval_ann.py
+
+Compare approximate (IVF) retrieval against the exact TF-IDF path.
+
+Reports query latency and recall@k (overlap with the exact top-k) for a sweep
+of `n_probe` values, as JSON on stdout.
+
+Usage:
+    python benchmarks/retrieval_ann.py --units 50000
+    python benchmarks/retrieval_ann.py --index index.json --n-probe 1 4 16
+"""
+
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from codelens.ann import IVFIndex
+from codelens.retriever import Retriever
+from codelens.utils import load_json
+
+def synthetic_units(n_units: int, vocab_size: int = 20000, words_per_unit: int = 60,
+                    topic_share: float = 0.7, seed: int = 0):
+    """
+    Units drawn mostly from one of many small topic vocabularies (like modules
+    sharing identifiers) plus Zipf-distributed common terms.
+    """
+    rng = random.Random(seed)
+    vocab = [f"tok{i}" for i in range(vocab_size)]
+    weights = [1.0 / (i + 1) for i in range(vocab_size)]
+    n_topics = max(1, n_units // 100)
+    topics = [[f"t{t}w{j}" for j in range(50)] for t in range(n_topics)]
+    n_topic_words = int(words_per_unit * topic_share)
+    units = []
+    for i in range(n_units):
+        topic = topics[rng.randrange(n_topics)]
+        words = rng.choices(topic, k=n_topic_words)
+        words += rng.choices(vocab, weights=weights, k=words_per_unit - n_topic_words)
+        units.append({"id": f"unit_{i}", "name": f"func_{i}", "kind": "function",
+                      "docstring": "", "code": " ".join(words)})
+    return units
+
+def sample_queries(units, n_queries: int, seed: int = 1):
+    rng = random.Random(seed)
+    queries = []
+    for u in rng.sample(units, min(n_queries, len(units))):
+        words = u["code"].split()
+        queries.append(" ".join(rng.sample(words, min(5, len(words)))))
+    return queries
+
+def timed(fn, queries):
+    latencies, results = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        results.append(fn(q))
+        latencies.append((time.perf_counter() - t0) * 1000)
+    return latencies, results
+
+def summarize(latencies):
+    ordered = sorted(latencies)
+    return {
+        "p50_ms": round(statistics.median(ordered), 3),
+        "p95_ms": round(ordered[int(0.95 * (len(ordered) - 1))], 3),
+        "mean_ms": round(statistics.mean(ordered), 3),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="ANN vs exact retrieval benchmark")
+    parser.add_argument("--index", help="index.json to benchmark (default: synthetic corpus)")
+    parser.add_argument("--units", type=int, default=20000, help="Synthetic corpus size")
+    parser.add_argument("--queries", type=int, default=200, help="Number of queries")
+    parser.add_argument("--k", type=int, default=10, help="Top K results")
+    parser.add_argument("--n-probe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--n-clusters", type=int, default=None)
+    args = parser.parse_args()
+
+    units = load_json(args.index) if args.index else synthetic_units(args.units)
+    queries = sample_queries(units, args.queries)
+
+    retriever = Retriever(mode="exact")
+    t0 = time.perf_counter()
+    retriever.index_units(units)
+    tfidf_s = time.perf_counter() - t0
+
+    exact_lat, exact_res = timed(lambda q: retriever.query_top_k(q, k=args.k, exact=True), queries)
+
+    t0 = time.perf_counter()
+    retriever.ann_index = IVFIndex(n_clusters=args.n_clusters).build(retriever.matrix)
+    ann_build_s = time.perf_counter() - t0
+
+    report = {
+        "units": len(units),
+        "queries": len(queries),
+        "k": args.k,
+        "tfidf_build_s": round(tfidf_s, 3),
+        "ann_build_s": round(ann_build_s, 3),
+        "n_clusters": retriever.ann_index.n_clusters,
+        "exact": summarize(exact_lat),
+        "ann": [],
+    }
+
+    for n_probe in args.n_probe:
+        retriever.n_probe = n_probe
+        ann_lat, ann_res = timed(lambda q: retriever.query_top_k(q, k=args.k), queries)
+        recalls = []
+        for exact_hits, ann_hits in zip(exact_res, ann_res):
+            truth = {uid for uid, _ in exact_hits}
+            if truth:
+                recalls.append(len(truth & {uid for uid, _ in ann_hits}) / len(truth))
+        report["ann"].append({
+            "n_probe": n_probe,
+            f"recall@{args.k}": round(statistics.mean(recalls), 4) if recalls else None,
+            **summarize(ann_lat),
+        })
+
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+stub_llm.py
+
+Local stand-in for the LLM providers, with injectable latency and errors.
+
+Answers both the Hugging Face raw-HTTP route (`/models/<model>/v1/chat/completions`)
+and the OpenAI route (`/chat/completions`) with a canned chat completion. Point
+the app at it with HUGGINGFACE_API_URL or OPENAI_BASE_URL.
+
+Usage:
+    python benchmarks/stub_llm.py --port 9100 --latency 0.5 --jitter 0.2 --error-rate 0.05
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+
+ANSWER = ("Component Summary: stub answer.\n"
+          "Call Flow: a -> b.\n"
+          "Key Points: generated by the stub LLM server.")
+
+def _make_handler(latency: float, jitter: float, error_rate: float):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("content-length", 0)))
+            self.server.requests_received += 1
+            time.sleep(max(0.0, latency + random.uniform(-jitter, jitter)))
+
+            if random.random() < error_rate:
+                status, body = 503, {"error": "stub: injected failure"}
+            else:
+                status, body = 200, {
+                    "id": "stub", "object": "chat.completion", "created": int(time.time()), "model": "stub",
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": ANSWER}}],
+                }
+            payload = json.dumps(body).encode("utf-8")
+            try:
+                self.send_response(status)
+                self.send_header("content-type", "application/json")
+                self.send_header("content-length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # client gave up (timeout / latency budget)
+
+        def log_message(self, *args):
+            pass
+
+    return StubHandler
+
+def start_stub_llm(latency: float = 0.2, jitter: float = 0.0, error_rate: float = 0.0,
+                   host: str = "127.0.0.1", port: int = 0) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    Serve the stub in a daemon thread; returns the server and its base URL.
+    `server.requests_received` counts the requests it has seen.
+    """
+    server = ThreadingHTTPServer((host, port), _make_handler(latency, jitter, error_rate))
+    server.daemon_threads = True
+    server.requests_received = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub LLM server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds per response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- seconds of random jitter")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of 503 responses")
+    args = parser.parse_args()
+
+    server, url = start_stub_llm(args.latency, args.jitter, args.error_rate, args.host, args.port)
+    print(f"Stub LLM listening on {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+ann.py
+
+IVF-style approximate nearest-neighbour index over TF-IDF vectors.
+
+Rows are projected to a small dense space with TruncatedSVD and grouped with
+k-means. A query only scores the rows in its `n_probe` closest clusters, and
+those candidates are re-ranked exactly against the original sparse matrix.
+Raising `n_probe` trades latency for recall; `n_probe == n_clusters` is exact.
+"""
+
+import math
+import numpy as np
+from typing import List, Optional, Tuple
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.decomposition import TruncatedSVD
+from sklearn.preprocessing import normalize
+from .utils import logger
+
+class IVFIndex:
+    def __init__(self, n_components: int = 128, n_clusters: Optional[int] = None,
+                 n_probe: int = 8, random_state: int = 0):
+        self.n_components = n_components
+        self.n_clusters = n_clusters
+        self.n_probe = n_probe
+        self.random_state = random_state
+        self.svd = None
+        self.projection = None
+        self.centroids = None
+        self.members: List[np.ndarray] = []
+
+    def build(self, matrix) -> "IVFIndex":
+        n_rows, n_features = matrix.shape
+        n_components = max(1, min(self.n_components, n_features - 1, n_rows - 1))
+        n_clusters = self.n_clusters or max(1, int(math.sqrt(n_rows)))
+        n_clusters = min(n_clusters, n_rows)
+
+        logger.info(f"Building IVF index: {n_rows} rows, {n_components} dims, {n_clusters} clusters")
+        self.svd = TruncatedSVD(n_components=n_components, random_state=self.random_state)
+        reduced = normalize(self.svd.fit_transform(matrix))
+        # (n_features, n_components) row-major so a query only touches its own terms
+        self.projection = np.ascontiguousarray(self.svd.components_.T)
+
+        kmeans = MiniBatchKMeans(n_clusters=n_clusters, random_state=self.random_state,
+                                 n_init=3, batch_size=max(1024, n_clusters * 4))
+        labels = kmeans.fit_predict(reduced)
+        self.centroids = normalize(kmeans.cluster_centers_)
+        self.members = [np.flatnonzero(labels == c) for c in range(n_clusters)]
+        self.n_clusters = n_clusters
+        return self
+
+    def candidates(self, query_vec, n_probe: Optional[int] = None) -> np.ndarray:
+        """Row indices in the `n_probe` clusters closest to the query."""
+        n_probe = min(n_probe or self.n_probe, self.n_clusters)
+        reduced = query_vec.data @ self.projection[query_vec.indices]
+        centroid_scores = self.centroids @ reduced
+        probe = np.argsort(centroid_scores)[-n_probe:]
+        return np.concatenate([self.members[c] for c in probe])
+
+    def search(self, matrix, query_vec, k: int,
+               n_probe: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Score candidate rows exactly and return the top-k (row, score) pairs."""
+        rows = self.candidates(query_vec, n_probe)
+        if rows.size == 0:
+            return []
+        # TF-IDF rows are L2-normalised, so the dot product is the cosine similarity
+        scores = (matrix[rows] @ query_vec.T).toarray().ravel()
+        top = np.argsort(scores)[-k:][::-1]
+        return [(int(rows[i]), float(scores[i])) for i in top]
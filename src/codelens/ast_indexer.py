@@ -1,4 +1,5 @@
 import ast
+import bisect
 import os
 from pathlib import Path
 from typing import List, Dict, Any, Optional
@@ -20,7 +21,7 @@ class CodeUnit:
         self.id = unit_id
         self.file_path = file_path
         self.name = name
-        self.kind = kind # 'function' or 'class'
+        self.kind = kind # 'function', 'class', 'file' or 'chunk'
         self.start_line = start_line
         self.end_line = end_line
         self.code = code
@@ -121,9 +122,181 @@ class ASTVisitor(ast.NodeVisitor):
         self.generic_visit(node)
         self.current_class = prev_class
 
-def index_repo(repo_path: str) -> List[Dict[str, Any]]:
+# Guards and chunking knobs for non-Python files
+MAX_FILE_SIZE = 1_000_000       # bytes; larger files are skipped
+CHUNK_LINES = 120               # max lines per chunk
+CHUNK_OVERLAP = 20              # lines shared between consecutive chunks
+CHUNK_MAX_CHARS = 12_000        # max characters per chunk, whatever the line count
+MINIFIED_AVG_LINE_LENGTH = 300  # avg chars per line above which a .js/.ts file looks minified
+MINIFIED_MAX_LINE_LENGTH = 5000 # any single line longer than this looks minified
+SPLIT_LINE_LENGTH = 1000        # longer lines are split into pieces rather than skipped
+
+CHUNKED_EXTENSIONS = ('.java', '.js', '.ts', '.md', '.txt')
+BRACE_EXTENSIONS = ('.java', '.js', '.ts')
+MINIFIABLE_EXTENSIONS = ('.js', '.ts')
+
+def _is_binary(path: Path, sniff_bytes: int = 8192) -> bool:
+    """Treat a file as binary if its first few KB contain a NUL byte."""
+    with open(path, 'rb') as f:
+        return b'\x00' in f.read(sniff_bytes)
+
+def _looks_minified(lines: List[str]) -> bool:
+    if not lines:
+        return False
+    lengths = [len(line) for line in lines]
+    if max(lengths) > MINIFIED_MAX_LINE_LENGTH:
+        return True
+    return sum(lengths) / len(lines) > MINIFIED_AVG_LINE_LENGTH
+
+def _split_long_lines(lines: List[str], limit: int = SPLIT_LINE_LENGTH) -> tuple:
+    """
+    Break lines longer than `limit` into pieces (at the last space where possible)
+    so one huge paragraph cannot make an unbounded chunk. Returns the pieces and
+    the 1-based source line number of each piece.
+    """
+    pieces, line_numbers = [], []
+    for number, line in enumerate(lines, start=1):
+        while len(line) > limit:
+            cut = line.rfind(' ', 0, limit) + 1 or limit
+            pieces.append(line[:cut])
+            line_numbers.append(number)
+            line = line[cut:]
+        pieces.append(line)
+        line_numbers.append(number)
+    return pieces, line_numbers
+
+def _join_pieces(pieces: List[str], line_numbers: List[int]) -> str:
+    """Inverse of `_split_long_lines` for a contiguous run of pieces."""
+    out = []
+    for i, piece in enumerate(pieces):
+        if i and line_numbers[i] != line_numbers[i - 1]:
+            out.append("\n")
+        out.append(piece)
+    return "".join(out)
+
+def _boundary_lines(lines: List[str], suffix: str) -> Dict[int, int]:
+    """
+    Return {0-based line index: rank} for places where it is cheap and natural to
+    start a new chunk; a lower rank is a better cut. Markdown headings (outside
+    code fences) rank 0. For brace languages every line is a candidate ranked by
+    the brace depth before it, so a window is cut between top-level blocks where
+    it can and between class members otherwise (a Java file is one class).
+    """
+    boundaries = {}
+    if suffix == '.md':
+        in_fence = False
+        for i, line in enumerate(lines):
+            if line.lstrip().startswith('```'):
+                in_fence = not in_fence
+            elif not in_fence and line.startswith('#'):
+                boundaries[i] = 0
+    elif suffix in BRACE_EXTENSIONS:
+        depth = 0
+        for i, line in enumerate(lines):
+            depth = max(0, depth + line.count('{') - line.count('}'))
+            boundaries[i + 1] = depth
+    return boundaries
+
+def validate_chunking(chunk_lines: int, overlap: int) -> None:
+    """Raise ValueError unless 1 <= chunk_lines and 0 <= overlap < chunk_lines."""
+    if chunk_lines < 1:
+        raise ValueError(f"chunk_lines must be at least 1, got {chunk_lines}")
+    if not 0 <= overlap < chunk_lines:
+        raise ValueError(f"chunk overlap must be in [0, {chunk_lines}), got {overlap}")
+
+def _chunk_ranges(lines: List[str], suffix: str,
+                  chunk_lines: int = CHUNK_LINES,
+                  overlap: int = CHUNK_OVERLAP,
+                  max_chars: int = CHUNK_MAX_CHARS) -> List[tuple]:
+    """
+    Split a file into overlapping [start, end) line windows of at most `chunk_lines`
+    lines and `max_chars` characters (a single longer line is kept whole). The
+    window is cut at the best-ranked structural boundary in its second half, so
+    chunks follow headings / blocks. A window shortened by the character budget
+    overlaps the next one by at most half its length.
+    """
+    validate_chunking(chunk_lines, overlap)
+    total = len(lines)
+    # offsets[i] = characters (newlines included) before line i
+    offsets = [0]
+    for line in lines:
+        offsets.append(offsets[-1] + len(line) + 1)
+    if total <= chunk_lines and offsets[-1] <= max_chars:
+        return [(0, total)]
+
+    boundaries = _boundary_lines(lines, suffix)
+    ranges = []
+    start = 0
+    while start < total:
+        end = min(start + chunk_lines, total)
+        capped = False
+        if offsets[end] - offsets[start] > max_chars:
+            end = max(start + 1, bisect.bisect_right(offsets, offsets[start] + max_chars) - 1)
+            capped = True
+        if end < total:
+            # Prefer the best-ranked boundary in the second half of the window, latest on ties
+            candidates = [b for b in range(end, start + (end - start) // 2, -1) if b in boundaries]
+            if candidates:
+                end = min(candidates, key=boundaries.__getitem__)
+        ranges.append((start, end))
+        if end >= total:
+            break
+        step_back = min(overlap, (end - start) // 2) if capped else overlap
+        start = max(end - step_back, start + 1)
+    return ranges
+
+def _file_units(content: str, rel_path: Path, file: str,
+                chunk_lines: int = CHUNK_LINES,
+                overlap: int = CHUNK_OVERLAP) -> List[CodeUnit]:
+    lines = content.splitlines()
+    pieces, line_numbers = _split_long_lines(lines)
+    ranges = _chunk_ranges(pieces, rel_path.suffix, chunk_lines, overlap)
+
+    if len(ranges) == 1:
+        # Small file: keep a single unit for the whole file
+        return [CodeUnit(
+            unit_id=str(rel_path),
+            file_path=str(rel_path),
+            name=file,
+            kind='file',
+            start_line=1,
+            end_line=len(lines),
+            code=content,
+            docstring=None,
+            signature=None
+        )]
+
+    units = []
+    seen_ids = set()
+    for start, end in ranges:
+        first, last = line_numbers[start], line_numbers[end - 1]
+        unit_id = f"{rel_path}#L{first}-L{last}"
+        if unit_id in seen_ids:
+            # Several chunks of one split line share a line range
+            unit_id = f"{unit_id}.{start}"
+        seen_ids.add(unit_id)
+        units.append(CodeUnit(
+            unit_id=unit_id,
+            file_path=str(rel_path),
+            name=f"{file}:{first}-{last}",
+            kind='chunk',
+            start_line=first,
+            end_line=last,
+            code=_join_pieces(pieces[start:end], line_numbers[start:end]),
+            docstring=None,
+            signature=None
+        ))
+    return units
+
+def index_repo(repo_path: str,
+               max_file_size: int = MAX_FILE_SIZE,
+               chunk_lines: int = CHUNK_LINES,
+               chunk_overlap: int = CHUNK_OVERLAP) -> List[Dict[str, Any]]:
+    validate_chunking(chunk_lines, chunk_overlap)
     repo_path = Path(repo_path).resolve()
     all_units = []
+    skipped_files = 0
+    chunked_files = 0
     
     logger.info(f"Indexing repo at {repo_path}")
     
@@ -147,26 +320,38 @@ def index_repo(repo_path: str) -> List[Dict[str, Any]]:
                     all_units.extend([u.to_dict() for u in visitor.units])
                 except Exception as e:
                     logger.error(f"Failed to parse {full_path}: {e}")
-            elif file.endswith(('.java', '.js', '.ts', '.md', '.txt')):
+            elif file.endswith(CHUNKED_EXTENSIONS):
                 try:
-                    with open(full_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
+                    size = full_path.stat().st_size
+                    if max_file_size and size > max_file_size:
+                        logger.info(f"Skipping {rel_path}: {size} bytes exceeds max file size")
+                        skipped_files += 1
+                        continue
+                    if _is_binary(full_path):
+                        logger.info(f"Skipping {rel_path}: looks binary")
+                        skipped_files += 1
+                        continue
+
+                    try:
+                        with open(full_path, 'r', encoding='utf-8') as f:
+                            content = f.read()
+                    except UnicodeDecodeError:
+                        logger.info(f"Skipping {rel_path}: not valid UTF-8")
+                        skipped_files += 1
+                        continue
+
+                    if file.endswith(MINIFIABLE_EXTENSIONS) and _looks_minified(content.splitlines()):
+                        logger.info(f"Skipping {rel_path}: looks minified")
+                        skipped_files += 1
+                        continue
                     
-                    # Create a single unit for the whole file
-                    unit = CodeUnit(
-                        unit_id=str(rel_path),
-                        file_path=str(rel_path),
-                        name=file,
-                        kind='file',
-                        start_line=1,
-                        end_line=len(content.splitlines()),
-                        code=content,
-                        docstring=None,
-                        signature=None
-                    )
-                    all_units.append(unit.to_dict())
+                    units = _file_units(content, rel_path, file, chunk_lines, chunk_overlap)
+                    if len(units) > 1:
+                        chunked_files += 1
+                    all_units.extend([u.to_dict() for u in units])
                 except Exception as e:
                     logger.error(f"Failed to read {full_path}: {e}")
                     
-    logger.info(f"Indexed {len(all_units)} units")
+    logger.info(f"Indexed {len(all_units)} units "
+                f"({chunked_files} files chunked, {skipped_files} files skipped)")
     return all_units
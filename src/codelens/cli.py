@@ -2,18 +2,27 @@ import argparse
 import sys
 import json
 from pathlib import Path
-from .ast_indexer import index_repo
+from .ast_indexer import index_repo, validate_chunking, MAX_FILE_SIZE, CHUNK_LINES, CHUNK_OVERLAP
 from .utils import save_json, load_json, logger
 from .query_pipeline import QueryPipeline
+from .index_store import publish_index
 
 def index_command(args):
     repo_path = args.repo
     out_path = args.out
     
-    units = index_repo(repo_path)
+    units = index_repo(repo_path,
+                       max_file_size=args.max_file_size,
+                       chunk_lines=args.chunk_lines,
+                       chunk_overlap=args.chunk_overlap)
     save_json(units, out_path)
     print(f"Index saved to {out_path}")
 
+def publish_command(args):
+    units = load_json(args.index)
+    generation = publish_index(units, args.store, meta={"path": args.index})
+    print(f"Published {len(units)} units to {args.store} as {generation}")
+
 def query_command(args):
     repo_path = args.repo # Not used if we load index directly, but let's assume we re-index or load default
     # For simplicity, we'll assume a temporary index file or re-index on the fly if no index file provided
@@ -31,7 +40,7 @@ def query_command(args):
         units = index_repo(repo_path)
         
     pipeline = QueryPipeline(units)
-    result = pipeline.run(args.q, k=args.k)
+    result = pipeline.run(args.q, k=args.k, path=args.path, kind=args.kind, file_type=args.file_type)
     
     print("\n=== ANSWER ===")
     print(json.dumps(result, indent=2))
@@ -47,17 +56,37 @@ def main():
     idx_parser = subparsers.add_parser("index", help="Index a repository")
     idx_parser.add_argument("--repo", required=True, help="Path to repo")
     idx_parser.add_argument("--out", default="index.json", help="Output JSON file")
+    idx_parser.add_argument("--max-file-size", type=int, default=MAX_FILE_SIZE,
+                            help="Skip files larger than this many bytes (0 disables)")
+    idx_parser.add_argument("--chunk-lines", type=int, default=CHUNK_LINES,
+                            help="Max lines per chunk for non-Python files")
+    idx_parser.add_argument("--chunk-overlap", type=int, default=CHUNK_OVERLAP,
+                            help="Lines of overlap between consecutive chunks")
+    
+    # Publish command
+    pub_parser = subparsers.add_parser("publish", help="Publish an index to a shared store for multi-worker serving")
+    pub_parser.add_argument("--index", default="index.json", help="Index JSON file")
+    pub_parser.add_argument("--store", required=True, help="Shared index directory (CODELENS_SHARED_INDEX)")
     
     # Query command
     q_parser = subparsers.add_parser("query", help="Ask a question")
     q_parser.add_argument("--repo", required=True, help="Path to repo")
     q_parser.add_argument("--q", required=True, help="Question")
     q_parser.add_argument("--k", type=int, default=5, help="Top K results")
+    q_parser.add_argument("--path", help="Only search under this directory/file prefix or glob (e.g. 'src/api' or '*/models/*.py')")
+    q_parser.add_argument("--kind", action="append", help="Only search units of this kind (function, class, file, chunk); repeatable")
+    q_parser.add_argument("--file-type", action="append", help="Only search files with this extension (e.g. py, md); repeatable")
     
     args = parser.parse_args()
     
     if args.command == "index":
+        try:
+            validate_chunking(args.chunk_lines, args.chunk_overlap)
+        except ValueError as e:
+            parser.error(str(e))
         index_command(args)
+    elif args.command == "publish":
+        publish_command(args)
     elif args.command == "query":
         query_command(args)
     else:
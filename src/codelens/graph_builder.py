@@ -1,5 +1,5 @@
 import networkx as nx
-from typing import List, Dict, Any, Set
+from typing import List, Dict, Any, Set, Tuple
 from .utils import logger
 
 class GraphBuilder:
@@ -56,3 +56,8 @@ class GraphBuilder:
                 relevant_ids.update(self.graph.predecessors(uid))
         
         return [self.unit_map[uid] for uid in relevant_ids if uid in self.unit_map]
+
+    def edges_within(self, unit_ids) -> List[Tuple[str, str, str]]:
+        """Edges whose endpoints are both in `unit_ids`, as (source, target, type)."""
+        subgraph = self.graph.subgraph(unit_ids)
+        return [(u, v, data.get('type', 'rel')) for u, v, data in subgraph.edges(data=True)]
@@ -0,0 +1,367 @@
+"""
+index_store.py
+
+Read-only, memory-mapped index artifacts shared between serving processes.
+
+One builder process publishes a generation directory containing the unit
+store, the call graph as CSR adjacency arrays, the TF-IDF matrix and the fitted
+vectorizer. Any number of worker processes attach to it with `mmap`, so the
+operating system keeps a single copy in the page cache. Publishing a new
+generation is atomic: files are written to a temporary directory, renamed into
+place, and only then is the `CURRENT` pointer swapped with `os.replace`.
+Workers call `IndexReader.refresh()` to pick up the new generation.
+
+Everything that grows with the repo is a flat file opened with `mmap`:
+strings are stored as UTF-8 bytes plus an offsets array and looked up by
+binary search, so no worker builds a per-process dict or list of them. Only
+small things (vectorizer parameters, the kind/extension names) are unpickled
+or parsed per process.
+
+Layout:
+    <root>/CURRENT                  name of the live generation
+    <root>/.lock                    serialises builders
+    <root>/gen-000001/units.bin     JSON records, back to back
+                      offsets.npy   byte offsets into units.bin (n + 1)
+                      ids.*         unit ids in row order (string table)
+                      id_order.npy  rows sorted by unit id, for id -> row lookup
+                      filter_*      row filter: rows sorted by path, the sorted
+                                    paths (string table), path runs, and rows
+                                    grouped by kind and extension
+                      succ_*.npy    call graph CSR (callees)
+                      pred_*.npy    call graph CSR (callers)
+                      tfidf_*.npy   TF-IDF CSR matrix
+                      terms.*       vocabulary in column order (sorted string table)
+                      idf.npy       IDF weight per column
+                      vectorizer.pkl  unfitted vectorizer, for its parameters only
+                      meta.json
+"""
+
+import bisect
+import fcntl
+import json
+import mmap
+import os
+import pickle
+import shutil
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
+import numpy as np
+from scipy.sparse import csr_matrix
+from sklearn.base import clone
+from sklearn.preprocessing import normalize
+from .graph_builder import GraphBuilder
+from .retriever import Retriever, RowFilter
+from .utils import logger
+
+KEEP_GENERATIONS = 2  # live generation plus the one workers may still be reading
+
+@contextmanager
+def builder_lock(root: str | Path) -> Iterator[None]:
+    """Exclusive lock so only one process builds/publishes at a time."""
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    with open(root / ".lock", "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def current_generation(root: str | Path) -> Optional[str]:
+    try:
+        name = (Path(root) / "CURRENT").read_text().strip()
+    except FileNotFoundError:
+        return None
+    return name or None
+
+def _save_csr(path: Path, prefix: str, matrix: csr_matrix):
+    # scipy copies on load unless indices and indptr share a dtype
+    idx_dtype = np.int32 if max(matrix.nnz, *matrix.shape) < 2**31 else np.int64
+    np.save(path / f"{prefix}_data.npy", matrix.data)
+    np.save(path / f"{prefix}_indices.npy", matrix.indices.astype(idx_dtype))
+    np.save(path / f"{prefix}_indptr.npy", matrix.indptr.astype(idx_dtype))
+    np.save(path / f"{prefix}_shape.npy", np.array(matrix.shape))
+
+def _load_csr(path: Path, prefix: str) -> csr_matrix:
+    data = np.load(path / f"{prefix}_data.npy", mmap_mode='r')
+    indices = np.load(path / f"{prefix}_indices.npy", mmap_mode='r')
+    indptr = np.load(path / f"{prefix}_indptr.npy", mmap_mode='r')
+    shape = tuple(np.load(path / f"{prefix}_shape.npy"))
+    return csr_matrix((data, indices, indptr), shape=shape, copy=False)
+
+def _save_strings(path: Path, name: str, strings: Iterable[str]):
+    offsets = [0]
+    with open(path / f"{name}.bin", "wb") as f:
+        for value in strings:
+            offsets.append(offsets[-1] + f.write(value.encode('utf-8')))
+    np.save(path / f"{name}_offsets.npy", np.array(offsets, dtype=np.int64))
+
+def _save_groups(path: Path, name: str, groups: Dict[str, np.ndarray]):
+    names = sorted(groups)
+    sizes = [len(groups[g]) for g in names]
+    np.save(path / f"{name}_rows.npy",
+            np.concatenate([groups[g] for g in names]) if names else np.empty(0, dtype=np.int64))
+    np.save(path / f"{name}_ptr.npy", np.cumsum([0] + sizes, dtype=np.int64))
+    with open(path / f"{name}_names.json", "w", encoding='utf-8') as f:
+        json.dump(names, f)
+
+def _load_groups(path: Path, name: str) -> Dict[str, np.ndarray]:
+    rows = np.load(path / f"{name}_rows.npy", mmap_mode='r')
+    ptr = np.load(path / f"{name}_ptr.npy")
+    with open(path / f"{name}_names.json", encoding='utf-8') as f:
+        names = json.load(f)
+    return {g: rows[ptr[i]:ptr[i + 1]] for i, g in enumerate(names)}
+
+def _save_row_filter(path: Path, row_filter: RowFilter):
+    np.save(path / "filter_order.npy", row_filter.order)
+    _save_strings(path, "filter_paths", row_filter.sorted_paths)
+    np.save(path / "filter_file_starts.npy", row_filter.file_starts)
+    _save_groups(path, "filter_kind", row_filter.by_kind)
+    _save_groups(path, "filter_ext", row_filter.by_ext)
+
+def _load_row_filter(path: Path) -> RowFilter:
+    return RowFilter.from_arrays(
+        np.load(path / "filter_order.npy", mmap_mode='r'),
+        StringTable(path, "filter_paths"),
+        np.load(path / "filter_file_starts.npy", mmap_mode='r'),
+        _load_groups(path, "filter_kind"),
+        _load_groups(path, "filter_ext"),
+    )
+
+def _save_vectorizer(path: Path, vectorizer):
+    """Files read back by `MappedVectorizer`."""
+    # A fitted vectorizer's vocabulary is sorted, so column j is term j
+    _save_strings(path, "terms", vectorizer.get_feature_names_out())
+    if vectorizer.use_idf:
+        np.save(path / "idf.npy", vectorizer.idf_)
+    with open(path / "vectorizer.pkl", "wb") as f:
+        pickle.dump(clone(vectorizer), f)
+
+def publish_index(units: List[Dict[str, Any]], root: str | Path,
+                  meta: Optional[Dict[str, Any]] = None, if_missing: bool = False) -> str:
+    """
+    Build all artifacts for `units` and atomically make them the live generation.
+    With `if_missing`, do nothing if another process already published one.
+    """
+    root = Path(root)
+    with builder_lock(root):
+        if if_missing and current_generation(root):
+            return current_generation(root)
+        existing = sorted(p.name for p in root.glob("gen-*") if p.is_dir())
+        number = int(existing[-1].split("-")[1]) + 1 if existing else 1
+        name = f"gen-{number:06d}"
+        tmp = root / f".tmp-{name}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir()
+
+        logger.info(f"Publishing {len(units)} units as {name}")
+
+        # Unit store
+        offsets = [0]
+        with open(tmp / "units.bin", "wb") as f:
+            for u in units:
+                offsets.append(offsets[-1] + f.write(json.dumps(u).encode('utf-8')))
+        np.save(tmp / "offsets.npy", np.array(offsets, dtype=np.int64))
+        ids = [u['id'] for u in units]
+        _save_strings(tmp, "ids", ids)
+        np.save(tmp / "id_order.npy",
+                np.array(sorted(range(len(ids)), key=ids.__getitem__), dtype=np.int64))
+
+        # Call graph as CSR adjacency over unit rows
+        row_of = {uid: i for i, uid in enumerate(ids)}
+        graph = GraphBuilder(units).build()
+        src = [row_of[u] for u, v in graph.edges()]
+        dst = [row_of[v] for u, v in graph.edges()]
+        adjacency = csr_matrix((np.ones(len(src), dtype=np.int8), (src, dst)),
+                               shape=(len(ids), len(ids)))
+        _save_csr(tmp, "succ", adjacency)
+        _save_csr(tmp, "pred", adjacency.T.tocsr())
+
+        # TF-IDF
+        retriever = Retriever(mode="exact")
+        retriever.index_units(units)
+        if retriever.matrix is not None:
+            _save_csr(tmp, "tfidf", retriever.matrix)
+            _save_row_filter(tmp, retriever.row_filter)
+            _save_vectorizer(tmp, retriever.vectorizer)
+
+        with open(tmp / "meta.json", "w", encoding='utf-8') as f:
+            json.dump({"generation": name, "count": len(units), **(meta or {})}, f)
+
+        os.rename(tmp, root / name)
+        pointer = root / "CURRENT.tmp"
+        pointer.write_text(name)
+        os.replace(pointer, root / "CURRENT")
+
+        for old in existing[:-(KEEP_GENERATIONS - 1) or None]:
+            shutil.rmtree(root / old, ignore_errors=True)
+    return name
+
+class StringTable:
+    """Read-only sequence of strings stored as UTF-8 bytes plus an offsets array."""
+
+    def __init__(self, path: Path, name: str):
+        self.offsets = np.load(path / f"{name}_offsets.npy", mmap_mode='r')
+        with open(path / f"{name}.bin", "rb") as f:
+            self._buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.offsets[-1] else b""
+
+    def __getitem__(self, i) -> str:
+        return self._buf[self.offsets[i]:self.offsets[i + 1]].decode('utf-8')
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __iter__(self) -> Iterator[str]:
+        return (self[i] for i in range(len(self)))
+
+    def find(self, value: str, order: Optional[np.ndarray] = None) -> int:
+        """
+        Position of `value`, or -1. The table must be sorted, or `order` must
+        list its positions in sorted order.
+        """
+        if order is None:
+            i = bisect.bisect_left(self, value)
+            return i if i < len(self) and self[i] == value else -1
+        i = bisect.bisect_left(order, value, key=self.__getitem__)
+        return int(order[i]) if i < len(order) and self[order[i]] == value else -1
+
+class UnitStore:
+    """Read-only `{unit_id: unit}` mapping decoded lazily from a memory-mapped file."""
+
+    def __init__(self, path: Path):
+        self.ids = StringTable(path, "ids")
+        self._id_order = np.load(path / "id_order.npy", mmap_mode='r')
+        self.offsets = np.load(path / "offsets.npy", mmap_mode='r')
+        with open(path / "units.bin", "rb") as f:
+            self._buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.offsets[-1] else b""
+
+    def row_of(self, uid: str) -> int:
+        """Row of unit `uid`, or -1."""
+        return self.ids.find(uid, self._id_order)
+
+    def row(self, i: int) -> Dict[str, Any]:
+        return json.loads(self._buf[self.offsets[i]:self.offsets[i + 1]])
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            row = self.row_of(key)
+            if row < 0:
+                raise KeyError(key)
+            return self.row(row)
+        return self.row(int(key))
+
+    def __contains__(self, uid) -> bool:
+        return self.row_of(uid) >= 0
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return (self.row(i) for i in range(len(self.ids)))
+
+class MappedVectorizer:
+    """
+    `transform()` of a fitted TfidfVectorizer, with the vocabulary and IDF
+    weights read from memory-mapped files instead of per-process dicts.
+    """
+
+    def __init__(self, path: Path):
+        with open(path / "vectorizer.pkl", "rb") as f:
+            self.params = pickle.load(f)
+        self._analyzer = self.params.build_analyzer()
+        self.terms = StringTable(path, "terms")
+        self.idf = np.load(path / "idf.npy", mmap_mode='r') if self.params.use_idf else None
+
+    def transform(self, docs: Iterable[str]) -> csr_matrix:
+        params = self.params
+        data, indices, indptr = [], [], [0]
+        for doc in docs:
+            counts: Dict[int, int] = {}
+            for token in self._analyzer(doc):
+                column = self.terms.find(token)
+                if column >= 0:
+                    counts[column] = counts.get(column, 0) + 1
+            columns = sorted(counts)
+            values = np.array([counts[c] for c in columns], dtype=np.float64)
+            if params.binary:
+                values[:] = 1.0
+            if params.sublinear_tf:
+                values = np.log(values) + 1
+            if params.use_idf:
+                values = values * self.idf[columns]
+            data.extend(values)
+            indices.extend(columns)
+            indptr.append(len(indices))
+        matrix = csr_matrix((np.array(data, dtype=np.float64), indices, indptr),
+                            shape=(len(indptr) - 1, len(self.terms)))
+        return normalize(matrix, norm=params.norm, copy=False) if params.norm else matrix
+
+class GraphArrays:
+    """The subset of `GraphBuilder` used at query time, backed by CSR arrays."""
+
+    def __init__(self, path: Path, store: UnitStore):
+        self.store = store
+        self.succ = _load_csr(path, "succ")
+        self.pred = _load_csr(path, "pred")
+
+    def _neighbors(self, matrix: csr_matrix, row: int) -> np.ndarray:
+        return matrix.indices[matrix.indptr[row]:matrix.indptr[row + 1]]
+
+    def get_context_neighbors(self, unit_ids: List[str], depth: int = 1) -> List[Dict[str, Any]]:
+        rows = {self.store.row_of(uid) for uid in unit_ids} - {-1}
+        relevant = set(rows)
+        for row in rows:
+            relevant.update(self._neighbors(self.succ, row).tolist())
+            relevant.update(self._neighbors(self.pred, row).tolist())
+        return [self.store.row(r) for r in relevant]
+
+    def edges_within(self, unit_ids) -> List[Tuple[str, str, str]]:
+        rows = {self.store.row_of(uid) for uid in unit_ids} - {-1}
+        edges = []
+        for row in rows:
+            for target in self._neighbors(self.succ, row).tolist():
+                if target in rows:
+                    edges.append((self.store.ids[row], self.store.ids[target], 'call'))
+        return edges
+
+class SharedIndex:
+    """
+    All artifacts of one generation, attached read-only. Retrieval is always
+    exact; RETRIEVAL_MODE=ann / sharded do not apply to a shared index.
+    """
+
+    def __init__(self, root: str | Path, generation: str):
+        path = Path(root) / generation
+        self.generation = generation
+        with open(path / "meta.json", encoding='utf-8') as f:
+            self.meta: Dict[str, Any] = json.load(f)
+        self.units = UnitStore(path)
+        self.graph = GraphArrays(path, self.units)
+
+        self.retriever = Retriever(mode="exact")
+        if (path / "terms.bin").exists():
+            self.retriever.vectorizer = MappedVectorizer(path)
+            self.retriever.matrix = _load_csr(path, "tfidf")
+            self.retriever.units = self.units
+            self.retriever.row_filter = _load_row_filter(path)
+
+class IndexReader:
+    """Tracks the live generation under `root` and re-attaches when it changes."""
+
+    def __init__(self, root: str | Path):
+        self.root = Path(root)
+        self.index: Optional[SharedIndex] = None
+        mode = os.environ.get("RETRIEVAL_MODE", "exact").lower()
+        if mode != "exact":
+            logger.warning(f"RETRIEVAL_MODE={mode} is not supported with a shared index; "
+                           f"using exact retrieval")
+
+    def refresh(self) -> bool:
+        """Attach to the live generation; returns True if it changed."""
+        generation = current_generation(self.root)
+        if generation is None or (self.index and self.index.generation == generation):
+            return False
+        self.index = SharedIndex(self.root, generation)
+        logger.info(f"Attached to shared index {generation} ({len(self.index.units)} units)")
+        return True
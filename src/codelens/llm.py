@@ -8,15 +8,92 @@ Supports:
 3. Offline Mode - Free, Private, Deterministic (Fallback)
 
 No heavy local models or huge downloads required.
+
+Providers are tried in order (LLM_PROVIDER, then LLM_FALLBACK_PROVIDERS) within
+a per-query latency budget. Each call gets LLM_PROVIDER_TIMEOUT seconds, or by
+default an even share of what is left of the budget, so a slow provider cannot
+starve the fallbacks. A circuit breaker per provider skips one that keeps
+failing, and an optional hedge fires the next provider if the current one has
+not answered after LLM_HEDGE_DELAY seconds. Offline analysis is the last resort.
 """
 
 import os
 import json
+import threading
+import time
 import requests
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from typing import List, Dict, Any, Optional
 from .prompt_templates import ANSWER_TEMPLATE
 from .utils import logger
 
+class CircuitBreaker:
+    """
+    Health of one provider. Opens after `failure_threshold` consecutive failures
+    so the provider is skipped without waiting on it; after `reset_timeout`
+    seconds a single trial call is let through (half-open) to probe recovery.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.successes = 0
+        self.failures = 0
+        self.skipped = 0
+        self.last_error: Optional[str] = None
+        self.last_latency: Optional[float] = None
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = "half_open"
+            if self.state == "closed":
+                return True
+            if self.state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.skipped += 1
+            return False
+
+    def record_success(self, latency: float):
+        with self._lock:
+            self.state = "closed"
+            self.consecutive_failures = 0
+            self.successes += 1
+            self.last_latency = latency
+            self._trial_in_flight = False
+
+    def record_failure(self, error: str, latency: float):
+        with self._lock:
+            self.consecutive_failures += 1
+            self.failures += 1
+            self.last_error = error
+            self.last_latency = latency
+            if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+                if self.state != "open":
+                    logger.warning(f"Circuit breaker for {self.name} opened: {error}")
+                self.state = "open"
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "successes": self.successes,
+                "failures": self.failures,
+                "skipped": self.skipped,
+                "last_error": self.last_error,
+                "last_latency": self.last_latency,
+            }
+
 class LLMClient:
     def __init__(self):
         # Determine provider: "huggingface", "openai", or "none"
@@ -25,36 +102,67 @@ class LLMClient:
         # --- Hugging Face Config ---
         self.hf_token = os.environ.get("HUGGINGFACE_API_KEY") or os.environ.get("HF_TOKEN")
         self.hf_model = os.environ.get("HUGGINGFACE_MODEL", "HuggingFaceH4/zephyr-7b-beta")
+        self.hf_api_url = os.environ.get("HUGGINGFACE_API_URL", "https://api-inference.huggingface.co").rstrip("/")
         self.hf_client = None
         
         # --- OpenAI Config ---
         self.openai_api_key = os.environ.get("OPENAI_API_KEY")
         self.openai_model = os.environ.get("OPENAI_MODEL", "gpt-3.5-turbo")
 
-        # Initialize Provider
-        if self.provider == "huggingface":
-            if not self.hf_token:
-                logger.warning("HUGGINGFACE_API_KEY not set. Switching to offline mode.")
-                self.provider = "none"
-            else:
+        # --- Routing Config ---
+        self.latency_budget = float(os.environ.get("LLM_LATENCY_BUDGET", "30"))
+        self.hedge_delay = float(os.environ.get("LLM_HEDGE_DELAY", "0"))  # 0 disables hedging
+        # 0 splits the remaining budget evenly across the providers still to try
+        self.provider_timeout = float(os.environ.get("LLM_PROVIDER_TIMEOUT", "0"))
+        fallbacks = [p.strip().lower() for p in os.environ.get("LLM_FALLBACK_PROVIDERS", "").split(",") if p.strip()]
+
+        # Initialize Providers
+        self.providers: List[str] = []
+        for name in [self.provider] + fallbacks:
+            if name in self.providers:
+                continue
+            if name == "huggingface":
+                if not self.hf_token:
+                    logger.warning("HUGGINGFACE_API_KEY not set. Skipping Hugging Face.")
+                    continue
                 self._init_huggingface()
-                
-        elif self.provider == "openai":
-            if not self.openai_api_key:
-                logger.warning("OPENAI_API_KEY not set. Switching to offline mode.")
-                self.provider = "none"
-            else:
+                self.providers.append(name)
+            elif name == "openai":
+                if not self.openai_api_key:
+                    logger.warning("OPENAI_API_KEY not set. Skipping OpenAI.")
+                    continue
+                try:
+                    # Import up front so the first query's time budget is not spent on it
+                    import openai  # noqa: F401
+                except ImportError:
+                    logger.warning("openai not installed. Skipping OpenAI.")
+                    continue
                 logger.info(f"Using OpenAI API with model: {self.openai_model}")
-                
-        else:
+                self.providers.append(name)
+
+        if not self.providers:
             logger.info("Using offline analysis mode (fast & private).")
-            self.provider = "none"
+        self.provider = self.providers[0] if self.providers else "none"
+
+        failure_threshold = int(os.environ.get("LLM_BREAKER_FAILURES", "3"))
+        reset_timeout = float(os.environ.get("LLM_BREAKER_RESET", "30"))
+        self.breakers = {p: CircuitBreaker(p, failure_threshold, reset_timeout) for p in self.providers}
+        # Generous pool: calls abandoned at the budget keep a thread until their own timeout
+        self._executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm") if self.providers else None
+        self._stats_lock = threading.Lock()
+        self.requests_total = 0
+        self.fallbacks_total = 0
+        self.hedges_total = 0
 
     def _init_huggingface(self):
         """Initialize Hugging Face client with fallback to raw HTTP."""
+        if "HUGGINGFACE_API_URL" in os.environ:
+            logger.info(f"Using Hugging Face-compatible endpoint at {self.hf_api_url} over raw HTTP.")
+            return
         try:
             from huggingface_hub import InferenceClient
-            self.hf_client = InferenceClient(token=self.hf_token)
+            self.hf_client = InferenceClient(token=self.hf_token,
+                                             timeout=self.provider_timeout or self.latency_budget)
             logger.info(f"Hugging Face API ready. Model: {self.hf_model}")
         except ImportError:
             logger.warning("huggingface_hub not installed. Using raw HTTP requests.")
@@ -72,20 +180,143 @@ class LLMClient:
             context_str += f"--- {u.get('id', '?')} ---\n{u.get('code', '')[:500]}...\n\n"
         graph_str = "\n".join(graph_context)
 
-        # Route to provider
-        if self.provider == "huggingface":
-            return self._call_huggingface(question, context_str, graph_str, context_units, graph_context)
-        elif self.provider == "openai":
-            return self._call_openai(question, context_str, graph_str, context_units, graph_context)
-        else:
-            return self._fallback_logic(question, context_units, graph_context)
+        with self._stats_lock:
+            self.requests_total += 1
+
+        # Route to providers
+        if self.providers:
+            answer = self._route(question, context_str, graph_str, context_units, graph_context)
+            if answer:
+                return answer
+
+        with self._stats_lock:
+            self.fallbacks_total += 1
+        return self._fallback_logic(question, context_units, graph_context)
+
+    # -------------------------------------------------------------------------
+    # Routing: latency budget, circuit breakers, hedged requests
+    # -------------------------------------------------------------------------
+    def _route(self, question: str, context_str: str, graph_str: str,
+               context_units: List[Dict[str, Any]], graph_context: List[str]) -> Optional[Dict[str, Any]]:
+        """
+        Try providers in order until one answers or the latency budget runs out.
+        A provider that fails or overruns its own timeout starts the next one
+        straight away; with hedging, a provider that is merely slow also gets the
+        next one started alongside it.
+        """
+        deadline = time.monotonic() + self.latency_budget
+        queue = list(self.providers)
+        pending = {}
+
+        def launch_next() -> bool:
+            while queue:
+                name = queue.pop(0)
+                if not self.breakers[name].allow():
+                    logger.info(f"Skipping {name}: circuit open")
+                    continue
+                remaining = max(0.0, deadline - time.monotonic())
+                if self.provider_timeout > 0:
+                    timeout = min(remaining, self.provider_timeout)
+                else:
+                    # Leave an equal share for every provider that can still be tried
+                    timeout = remaining / (1 + sum(self.breakers[p].state != "open" for p in queue))
+                abandoned = threading.Event()
+                future = self._executor.submit(self._timed_call, name, timeout, abandoned, question,
+                                               context_str, graph_str, context_units, graph_context)
+                pending[future] = (name, abandoned, time.monotonic() + timeout, timeout)
+                return True
+            return False
+
+        def abandon(future, reason: str):
+            name, abandoned, _, timeout = pending.pop(future)
+            abandoned.set()
+            # Count the overrun now so the very next query already sees it
+            self.breakers[name].record_failure(reason, timeout)
+
+        launch_next()
+        while pending:
+            now = time.monotonic()
+            if now >= deadline:
+                logger.warning(f"LLM latency budget of {self.latency_budget}s exhausted")
+                for future in list(pending):
+                    abandon(future, "latency budget exceeded")
+                break
+            expired = [f for f, (_, _, call_deadline, _) in pending.items() if now >= call_deadline]
+            if expired:
+                for future in expired:
+                    logger.warning(f"{pending[future][0]} timed out; trying the next provider")
+                    abandon(future, "provider timeout exceeded")
+                if not pending:
+                    launch_next()
+                continue
+
+            hedging = self.hedge_delay > 0 and queue
+            next_deadline = min(call_deadline for _, _, call_deadline, _ in pending.values())
+            timeout = min(deadline, next_deadline) - now
+            if hedging:
+                timeout = min(timeout, self.hedge_delay)
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                if hedging and time.monotonic() < next_deadline and launch_next():
+                    with self._stats_lock:
+                        self.hedges_total += 1
+                continue
+            for future in done:
+                pending.pop(future)
+                answer = future.result()
+                if answer:
+                    return answer
+            if not pending:
+                launch_next()
+        return None
+
+    def _timed_call(self, name: str, timeout: float, abandoned: threading.Event, question: str,
+                    context_str: str, graph_str: str, context_units: List[Dict[str, Any]],
+                    graph_context: List[str]) -> Optional[Dict[str, Any]]:
+        """
+        Call one provider and record the outcome on its breaker, unless the router
+        already gave up on it and recorded the overrun. Never raises.
+        """
+        breaker = self.breakers[name]
+        start = time.monotonic()
+        try:
+            if name == "huggingface":
+                answer = self._call_huggingface(question, context_str, graph_str, context_units, graph_context, timeout)
+            else:
+                answer = self._call_openai(question, context_str, graph_str, context_units, graph_context, timeout)
+        except Exception as e:
+            if not abandoned.is_set():
+                breaker.record_failure(str(e), time.monotonic() - start)
+            logger.warning(f"{name} failed: {e}")
+            return None
+        if not abandoned.is_set():
+            breaker.record_success(time.monotonic() - start)
+        return answer
+
+    def stats(self) -> Dict[str, Any]:
+        """Breaker state per provider and how often we fell back to offline analysis."""
+        with self._stats_lock:
+            requests_total, fallbacks_total, hedges_total = self.requests_total, self.fallbacks_total, self.hedges_total
+        return {
+            "providers": {name: breaker.snapshot() for name, breaker in self.breakers.items()},
+            "requests": requests_total,
+            "fallbacks": fallbacks_total,
+            "fallback_rate": fallbacks_total / requests_total if requests_total else 0.0,
+            "hedges": hedges_total,
+            "latency_budget": self.latency_budget,
+            "provider_timeout": self.provider_timeout,
+            "hedge_delay": self.hedge_delay,
+        }
 
     # -------------------------------------------------------------------------
     # Hugging Face Implementation
     # -------------------------------------------------------------------------
     def _call_huggingface(self, question: str, context_str: str, graph_str: str, 
-                          context_units: List[Dict[str, Any]], graph_context: List[str]) -> Dict[str, Any]:
-        
+                          context_units: List[Dict[str, Any]], graph_context: List[str],
+                          timeout: float) -> Dict[str, Any]:
+        """Raises if neither the client nor raw HTTP produced an answer."""
+        deadline = time.monotonic() + timeout
+
         system_prompt = "You are a code analysis assistant. Analyze code and provide clear, structured answers."
         user_prompt = (f"Question: {question}\n\n"
                        f"Code Context:\n{context_str[:1500]}\n\n"
@@ -117,8 +348,11 @@ class LLMClient:
 
         # 2. Try Raw HTTP (Router) if client failed or not available
         if not generated_text:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("HF client used up the time budget")
             try:
-                api_url = f"https://api-inference.huggingface.co/models/{self.hf_model}/v1/chat/completions"
+                api_url = f"{self.hf_api_url}/models/{self.hf_model}/v1/chat/completions"
                 headers = {"Authorization": f"Bearer {self.hf_token}"}
                 payload = {
                     "model": self.hf_model,
@@ -126,27 +360,31 @@ class LLMClient:
                                  {"role": "user", "content": user_prompt}],
                     "max_tokens": 500, "temperature": 0.3
                 }
-                response = requests.post(api_url, headers=headers, json=payload, timeout=30)
+                response = requests.post(api_url, headers=headers, json=payload, timeout=remaining)
                 if response.status_code == 200:
                     generated_text = response.json()['choices'][0]['message']['content']
                 else:
                     logger.error(f"HF API Error: {response.status_code} - {response.text}")
+                    raise RuntimeError(f"HF API returned {response.status_code}")
             except Exception as e:
                 logger.error(f"HF Raw HTTP failed: {e}")
+                raise
 
-        if generated_text:
-            return self._structure_response(generated_text, context_units, graph_context, f"Hugging Face ({self.hf_model})")
-        
-        return self._fallback_logic(question, context_units, graph_context)
+        if not generated_text:
+            raise RuntimeError("HF returned an empty answer")
+        return self._structure_response(generated_text, context_units, graph_context, f"Hugging Face ({self.hf_model})")
 
     # -------------------------------------------------------------------------
     # OpenAI Implementation
     # -------------------------------------------------------------------------
     def _call_openai(self, question: str, context_str: str, graph_str: str,
-                     context_units: List[Dict[str, Any]], graph_context: List[str]) -> Dict[str, Any]:
+                     context_units: List[Dict[str, Any]], graph_context: List[str],
+                     timeout: float) -> Dict[str, Any]:
+        """Raises on failure so the router can record it and move on."""
         try:
             import openai
-            client = openai.OpenAI(api_key=self.openai_api_key)
+            # No SDK retries: the router decides whether to retry elsewhere
+            client = openai.OpenAI(api_key=self.openai_api_key, timeout=timeout, max_retries=0)
             
             prompt = ANSWER_TEMPLATE.format(question=question, context_str=context_str, graph_context=graph_str)
             
@@ -172,7 +410,7 @@ class LLMClient:
                 
         except Exception as e:
             logger.error(f"OpenAI call failed: {e}")
-            return self._fallback_logic(question, context_units, graph_context)
+            raise
 
     # -------------------------------------------------------------------------
     # Utilities & Fallback
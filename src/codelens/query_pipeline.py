@@ -1,11 +1,13 @@
-from typing import Dict, Any, List
+import os
+from typing import Dict, Any, List, Optional
 from .utils import load_json, logger
 from .graph_builder import GraphBuilder
 from .retriever import Retriever
+from .sharded_retriever import ShardedRetriever
 from .llm import LLMClient
 
 class QueryPipeline:
-    def __init__(self, index_data: List[Dict[str, Any]]):
+    def __init__(self, index_data: List[Dict[str, Any]], llm: Optional[LLMClient] = None):
         self.units = index_data
         self.unit_map = {u['id']: u for u in self.units}
         
@@ -13,16 +15,42 @@ class QueryPipeline:
         self.graph_builder = GraphBuilder(self.units)
         self.graph = self.graph_builder.build()
         
-        self.retriever = Retriever()
+        if os.environ.get("RETRIEVAL_MODE", "exact").lower() == "sharded":
+            self.retriever = ShardedRetriever()
+        else:
+            self.retriever = Retriever()
         self.retriever.index_units(self.units)
         
-        self.llm = LLMClient()
+        # Pass a long-lived client so breaker state and counters survive re-indexing
+        self.llm = llm or LLMClient()
 
-    def run(self, question: str, k: int = 5) -> Dict[str, Any]:
+    @classmethod
+    def from_shared_index(cls, index, llm: Optional[LLMClient] = None) -> "QueryPipeline":
+        """
+        Build a pipeline over a memory-mapped `index_store.SharedIndex` without
+        rebuilding the graph or TF-IDF matrix and without copying the units.
+        """
+        pipeline = cls.__new__(cls)
+        pipeline.units = index.units
+        pipeline.unit_map = index.units
+        pipeline.graph_builder = index.graph
+        pipeline.graph = None
+        pipeline.retriever = index.retriever
+        pipeline.llm = llm or LLMClient()
+        return pipeline
+
+    def close(self):
+        """Release retriever resources (shard worker pool and files); safe to call twice."""
+        close = getattr(self.retriever, "close", None)
+        if close:
+            close()
+
+    def run(self, question: str, k: int = 5, path: Optional[str] = None,
+            kind: Optional[List[str]] = None, file_type: Optional[List[str]] = None) -> Dict[str, Any]:
         logger.info(f"Processing query: {question}")
         
-        # 1. Retrieve relevant units
-        top_hits = self.retriever.query_top_k(question, k=k)
+        # 1. Retrieve relevant units (optionally scoped by path / kind / file type)
+        top_hits = self.retriever.query_top_k(question, k=k, path=path, kind=kind, file_type=file_type)
         top_unit_ids = [h[0] for h in top_hits]
         top_units = [self.unit_map[uid] for uid in top_unit_ids]
         
@@ -37,9 +65,8 @@ class QueryPipeline:
         
         # 3. Build Graph Context String (edges)
         graph_edges = []
-        subgraph = self.graph.subgraph(all_context_ids)
-        for u, v, data in subgraph.edges(data=True):
-            graph_edges.append(f"{u} -> {v} ({data.get('type', 'rel')})")
+        for u, v, edge_type in self.graph_builder.edges_within(all_context_ids):
+            graph_edges.append(f"{u} -> {v} ({edge_type})")
             
         # 4. Generate Answer
         answer = self.llm.generate_answer(question, final_context_units, graph_edges)
@@ -1,15 +1,124 @@
 import os
+import bisect
+import fnmatch
 import numpy as np
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Iterable, Optional, Sequence, Tuple, Union
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from .ann import IVFIndex
 from .utils import logger
 
+# Below this many units an approximate index is not worth building
+ANN_MIN_UNITS = 2000
+
+def _as_list(value: Union[str, Iterable[str], None]) -> List[str]:
+    if not value:
+        return []
+    return [value] if isinstance(value, str) else list(value)
+
+class RowFilter:
+    """
+    Precomputed row sets for scoping a query before scoring: by path (directory
+    prefix or glob), unit kind and file type. Paths are kept sorted so a
+    directory prefix resolves to a contiguous range with two binary searches.
+    """
+
+    def __init__(self, file_paths: List[str], kinds: List[str], cache_size: int = 128):
+        order = sorted(range(len(file_paths)), key=file_paths.__getitem__)
+        sorted_paths = [file_paths[i] for i in order]
+        # Start of each run of equal paths in sorted order, plus the end
+        file_starts = [i for i in range(len(order)) if i == 0 or sorted_paths[i] != sorted_paths[i - 1]]
+        file_starts.append(len(order))
+        self._init(np.array(order, dtype=np.int64), sorted_paths, np.array(file_starts, dtype=np.int64),
+                   self._group(kinds), self._group([os.path.splitext(p)[1].lower() for p in file_paths]),
+                   cache_size)
+
+    @classmethod
+    def from_arrays(cls, order: np.ndarray, sorted_paths: Sequence[str], file_starts: np.ndarray,
+                    by_kind: Dict[str, np.ndarray], by_ext: Dict[str, np.ndarray],
+                    cache_size: int = 128) -> "RowFilter":
+        """Rebuild from the arrays of an existing filter, e.g. memory-mapped from disk."""
+        row_filter = cls.__new__(cls)
+        row_filter._init(order, sorted_paths, file_starts, by_kind, by_ext, cache_size)
+        return row_filter
+
+    def _init(self, order, sorted_paths, file_starts, by_kind, by_ext, cache_size):
+        self.order = order                # row indices sorted by file path
+        self.sorted_paths = sorted_paths  # any sequence of str supporting bisect
+        self.file_starts = file_starts
+        self.by_kind = by_kind
+        self.by_ext = by_ext
+        self._cache: Dict[Tuple, np.ndarray] = {}
+        self._cache_size = cache_size
+
+    @staticmethod
+    def _group(values: List[str]) -> Dict[str, np.ndarray]:
+        groups: Dict[str, List[int]] = {}
+        for i, v in enumerate(values):
+            groups.setdefault(v, []).append(i)
+        return {v: np.array(rows, dtype=np.int64) for v, rows in groups.items()}
+
+    def _path_rows(self, pattern: str) -> np.ndarray:
+        pattern = pattern.strip()
+        if pattern.startswith("./"):
+            pattern = pattern[2:]
+        if any(c in pattern for c in "*?["):
+            starts = self.file_starts
+            matched = [self.order[starts[j]:starts[j + 1]] for j in range(len(starts) - 1)
+                       if fnmatch.fnmatch(self.sorted_paths[starts[j]], pattern)]
+            return np.concatenate(matched) if matched else np.empty(0, dtype=np.int64)
+
+        # Directory (or exact file) prefix: "src/api" matches "src/api/x.py", not "src/api2/x.py"
+        prefix = pattern.rstrip("/")
+        if not prefix:
+            return self.order
+        paths = self.sorted_paths
+        exact = (bisect.bisect_left(paths, prefix), bisect.bisect_right(paths, prefix))
+        below = (bisect.bisect_left(paths, prefix + "/"), bisect.bisect_left(paths, prefix + "/\U0010ffff"))
+        return np.concatenate([self.order[exact[0]:exact[1]], self.order[below[0]:below[1]]])
+
+    def _union(self, groups: Dict[str, np.ndarray], keys: List[str]) -> np.ndarray:
+        parts = [groups[k] for k in keys if k in groups]
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+    def rows(self, path: Optional[str] = None, kind=None, file_type=None) -> Optional[np.ndarray]:
+        """Sorted row indices matching every given filter, or None if no filter is set."""
+        kinds = sorted(_as_list(kind))
+        exts = sorted({("." + e.lstrip(".")).lower() for e in _as_list(file_type)})
+        if not (path or kinds or exts):
+            return None
+
+        key = (path, tuple(kinds), tuple(exts))
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+
+        row_sets = []
+        if path:
+            row_sets.append(self._path_rows(path))
+        if kinds:
+            row_sets.append(self._union(self.by_kind, kinds))
+        if exts:
+            row_sets.append(self._union(self.by_ext, exts))
+
+        selected = np.unique(row_sets[0])
+        for rows in row_sets[1:]:
+            selected = np.intersect1d(selected, np.unique(rows), assume_unique=True)
+
+        if len(self._cache) >= self._cache_size:
+            self._cache.pop(next(iter(self._cache)))
+        self._cache[key] = selected
+        return selected
+
 class Retriever:
-    def __init__(self):
+    def __init__(self, mode: Optional[str] = None, n_probe: Optional[int] = None):
         self.vectorizer = TfidfVectorizer(stop_words='english')
         self.units = []
         self.matrix = None
+        # "exact" scores every unit; "ann" scores only candidate clusters then re-ranks
+        self.mode = (mode or os.environ.get("RETRIEVAL_MODE", "exact")).lower()
+        self.n_probe = n_probe or int(os.environ.get("RETRIEVAL_N_PROBE", "8"))
+        self.ann_index = None
+        self.row_filter: Optional[RowFilter] = None
         self.use_openai = bool(os.environ.get("OPENAI_API_KEY"))
         
         if self.use_openai:
@@ -30,15 +139,43 @@ class Retriever:
             return
 
         logger.info(f"Indexing {len(corpus)} units with TF-IDF...")
-        self.matrix = self.vectorizer.fit_transform(corpus)
+        self.matrix = self.vectorizer.fit_transform(corpus).tocsr()
+        self.row_filter = RowFilter([u.get('file_path', '') for u in units], [u['kind'] for u in units])
 
-    def query_top_k(self, query: str, k: int = 5) -> List[Tuple[str, float]]:
+        self.ann_index = None
+        if self.mode == "ann":
+            if len(units) < ANN_MIN_UNITS:
+                logger.info(f"Only {len(units)} units; using exact retrieval instead of ANN.")
+            else:
+                self.ann_index = IVFIndex(n_probe=self.n_probe).build(self.matrix)
+
+    def query_top_k(self, query: str, k: int = 5, exact: bool = False,
+                    path: Optional[str] = None, kind=None, file_type=None) -> List[Tuple[str, float]]:
+        """
+        Top-k units for `query`. `path` (directory prefix or glob), `kind` and
+        `file_type` restrict scoring to the matching rows up front, so a narrow
+        scope both returns a full k and costs proportionally less. Scoped
+        queries always score their rows exactly.
+        """
         if self.matrix is None:
             return []
             
         query_vec = self.vectorizer.transform([query])
-        # Calculate cosine similarity
-        cosine_similarities = cosine_similarity(query_vec, self.matrix).flatten()
+        rows = self.row_filter.rows(path, kind, file_type) if self.row_filter else None
+
+        if self.ann_index is not None and not exact and rows is None:
+            if query_vec.nnz == 0:
+                return []
+            hits = self.ann_index.search(self.matrix, query_vec, k, self.n_probe)
+            return [(self.units[idx]['id'], score) for idx, score in hits if score > 0]
+
+        if rows is not None and rows.size == 0:
+            return []
+
+        # Calculate cosine similarity. TF-IDF rows and the query are already
+        # L2-normalised, so a sparse dot product is enough and avoids copying the matrix
+        matrix = self.matrix if rows is None else self.matrix[rows]
+        cosine_similarities = (matrix @ query_vec.T).toarray().ravel()
         
         # Get top k indices
         top_indices = cosine_similarities.argsort()[-k:][::-1]
@@ -47,6 +184,7 @@ class Retriever:
         for idx in top_indices:
             score = cosine_similarities[idx]
             if score > 0: # Filter out zero relevance
-                results.append((self.units[idx]['id'], float(score)))
+                unit_idx = idx if rows is None else rows[idx]
+                results.append((self.units[unit_idx]['id'], float(score)))
                 
         return results
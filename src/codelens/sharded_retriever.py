@@ -0,0 +1,271 @@
+"""
+sharded_retriever.py
+
+TF-IDF retrieval split across shards scored in a process pool.
+
+Units are partitioned by top-level directory (or into fixed-size groups). A
+single vectorizer is fitted on the whole corpus so every shard uses the same
+global IDF weights and scores are comparable across shards. Each shard's matrix
+is stored column-major (CSC, effectively an inverted index) in .npy files;
+worker processes memory-map them instead of receiving a pickled copy. A query
+fans out to all shards in parallel, reads only the columns of its own terms,
+and the per-shard top-k lists are merged.
+
+A shard can be rebuilt on its own when only its part of the repo changed. It is
+re-vectorized with the existing vocabulary and IDF; run a full `index_units`
+to refresh the global weights.
+
+Shard files go to a fresh directory under RETRIEVAL_SHARD_DIR (default: the
+system temp dir). It is removed by `close()` and, as a last resort, at
+interpreter exit. `close()` waits for queries already running on this
+instance, so a server can swap in a new retriever while requests are in flight.
+"""
+
+import atexit
+import heapq
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
+from scipy.sparse import csc_matrix
+from sklearn.feature_extraction.text import TfidfVectorizer
+from .retriever import RowFilter
+from .utils import logger
+
+SHARD_SIZE = 5000  # units per shard for the "size" strategy
+
+# Shard directories created by this process and not yet closed
+_owned_dirs: set = set()
+
+@atexit.register
+def _cleanup_shard_dirs():
+    for path in list(_owned_dirs):
+        shutil.rmtree(path, ignore_errors=True)
+    _owned_dirs.clear()
+
+def _unit_text(u: Dict[str, Any]) -> str:
+    return f"{u['name']} {u['kind']} {u.get('docstring', '')} {u['code']}"
+
+def partition_units(units: List[Dict[str, Any]], strategy: str = "directory",
+                    shard_size: int = SHARD_SIZE) -> Dict[str, List[Dict[str, Any]]]:
+    """Group units into shards keyed by top-level directory or by position."""
+    shards: Dict[str, List[Dict[str, Any]]] = {}
+    if strategy == "size":
+        for i in range(0, len(units), shard_size):
+            shards[f"shard-{i // shard_size}"] = units[i:i + shard_size]
+        return shards
+
+    for u in units:
+        parts = Path(u.get('file_path', u['id'])).parts
+        key = parts[0] if len(parts) > 1 else "."
+        shards.setdefault(key, []).append(u)
+    return shards
+
+# -----------------------------------------------------------------------------
+# Worker side: memory-mapped shard matrices cached per process
+# -----------------------------------------------------------------------------
+# shard key -> (generation path, matrix); a new generation evicts the old one
+_worker_cache: Dict[str, Tuple[str, csc_matrix]] = {}
+
+def _load_shard(path: str) -> csc_matrix:
+    key = path.rsplit(".", 1)[0]
+    cached = _worker_cache.get(key)
+    if cached is not None and cached[0] == path:
+        return cached[1]
+
+    base = Path(path)
+    data = np.load(base / "data.npy", mmap_mode='r')
+    indices = np.load(base / "indices.npy", mmap_mode='r')
+    indptr = np.load(base / "indptr.npy", mmap_mode='r')
+    shape = tuple(np.load(base / "shape.npy"))
+    matrix = csc_matrix((data, indices, indptr), shape=shape, copy=False)
+    _worker_cache[key] = (path, matrix)
+    return matrix
+
+def _evict_shards(shard_dir: Path):
+    """Drop cached maps of shards under `shard_dir` (in-process scoring caches in the parent)."""
+    prefix = str(shard_dir) + os.sep
+    for key in [k for k, (path, _) in _worker_cache.items() if path.startswith(prefix)]:
+        del _worker_cache[key]
+
+def _score_shard(path: str, q_indices: np.ndarray, q_data: np.ndarray,
+                 k: int, rows: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+    matrix = _load_shard(path)
+    # Only the query's columns are read; rows are L2-normalised so this is cosine
+    scores = np.asarray(matrix[:, q_indices] @ q_data).ravel()
+    if rows is not None:
+        scores = scores[rows]
+    if scores.size == 0:
+        return []
+    k = min(k, scores.size)
+    top = np.argpartition(scores, -k)[-k:]
+    row_ids = top if rows is None else rows[top]
+    return [(int(r), float(scores[i])) for i, r in zip(top, row_ids) if scores[i] > 0]
+
+# -----------------------------------------------------------------------------
+# Parent side
+# -----------------------------------------------------------------------------
+class ShardedRetriever:
+    def __init__(self, strategy: Optional[str] = None, workers: Optional[int] = None,
+                 shard_dir: Optional[str] = None, shard_size: int = SHARD_SIZE):
+        self.vectorizer = TfidfVectorizer(stop_words='english')
+        self.strategy = strategy or os.environ.get("RETRIEVAL_SHARD_BY", "directory")
+        # 0 scores shards in-process; a negative value means one worker per CPU
+        self.workers = workers if workers is not None else int(os.environ.get("RETRIEVAL_WORKERS", "-1"))
+        self.shard_size = shard_size
+        self._owns_dir = shard_dir is None
+        if shard_dir is None:
+            base = os.environ.get("RETRIEVAL_SHARD_DIR") or None
+            if base:
+                os.makedirs(base, exist_ok=True)
+            shard_dir = tempfile.mkdtemp(prefix="codelens-shards-", dir=base)
+            _owned_dirs.add(shard_dir)
+        self.shard_dir = Path(shard_dir)
+        self.units: List[Dict[str, Any]] = []
+        # shard key -> (current generation path, unit ids in row order, row filter)
+        self.shards: Dict[str, Tuple[str, List[str], RowFilter]] = {}
+        self._generation = 0
+        self._pool: Optional[ProcessPoolExecutor] = None
+        # In-flight queries keep the pool and shard files alive past close()
+        self._lock = threading.Lock()
+        self._active = 0
+        self._close_requested = False
+        self._released = False
+
+    def index_units(self, units: List[Dict[str, Any]]):
+        self.units = units
+        if not units:
+            logger.warning("No units to index.")
+            return
+
+        logger.info(f"Indexing {len(units)} units with TF-IDF (global IDF)...")
+        self.vectorizer.fit([_unit_text(u) for u in units])
+
+        for path, _, _ in self.shards.values():
+            shutil.rmtree(path, ignore_errors=True)
+        self.shards = {}
+        for key, shard_units in partition_units(units, self.strategy, self.shard_size).items():
+            self._write_shard(key, shard_units)
+        logger.info(f"Built {len(self.shards)} shards under {self.shard_dir}")
+
+    def rebuild_shard(self, key: str, units: List[Dict[str, Any]]):
+        """Replace one shard's units, e.g. after files under one directory changed."""
+        old = self.shards.get(key)
+        if units:
+            self._write_shard(key, units)
+        else:
+            self.shards.pop(key, None)
+        if old:
+            shutil.rmtree(old[0], ignore_errors=True)
+
+        others = {uid for k, (_, ids, _) in self.shards.items() if k != key for uid in ids}
+        self.units = [u for u in self.units if u['id'] in others] + list(units)
+
+    def _write_shard(self, key: str, units: List[Dict[str, Any]]):
+        matrix = self.vectorizer.transform([_unit_text(u) for u in units]).tocsc()
+        # A fresh directory per generation so workers never see a half-written shard
+        self._generation += 1
+        safe_key = "".join(c if c.isalnum() or c in "-_." else "_" for c in key)
+        path = self.shard_dir / f"{safe_key}.{self._generation}"
+        path.mkdir(parents=True)
+        np.save(path / "data.npy", matrix.data.astype(np.float64))
+        np.save(path / "indices.npy", matrix.indices.astype(np.int32))
+        np.save(path / "indptr.npy", matrix.indptr.astype(np.int32))
+        np.save(path / "shape.npy", np.array(matrix.shape))
+        row_filter = RowFilter([u.get('file_path', '') for u in units], [u['kind'] for u in units])
+        self.shards[key] = (str(path), [u['id'] for u in units], row_filter)
+
+    def _executor(self) -> Optional[ProcessPoolExecutor]:
+        with self._lock:
+            if self._pool is None and not self._released and self.workers != 0 and len(self.shards) > 1:
+                n = self.workers if self.workers > 0 else os.cpu_count() or 1
+                # Not fork: the pool is created from a request thread of a multithreaded
+                # server, and workers memory-map their shards instead of inheriting memory
+                method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+                self._pool = ProcessPoolExecutor(max_workers=min(n, len(self.shards)),
+                                                 mp_context=multiprocessing.get_context(method))
+            return self._pool
+
+    def query_top_k(self, query: str, k: int = 5, path: Optional[str] = None,
+                    kind=None, file_type=None) -> List[Tuple[str, float]]:
+        """
+        Same filters as `Retriever.query_top_k`; shards with no matching rows are
+        not queried. Returns [] once the retriever has been closed.
+        """
+        with self._lock:
+            if self._released:
+                return []
+            self._active += 1
+        try:
+            return self._query_top_k(query, k, path, kind, file_type)
+        finally:
+            with self._lock:
+                self._active -= 1
+                release = self._close_requested and self._active == 0 and not self._released
+                self._released = self._released or release
+            if release:
+                self._release()
+
+    def _query_top_k(self, query: str, k: int, path: Optional[str],
+                     kind, file_type) -> List[Tuple[str, float]]:
+        if not self.shards:
+            return []
+
+        query_vec = self.vectorizer.transform([query])
+        if query_vec.nnz == 0:
+            return []
+        q_indices, q_data = query_vec.indices, query_vec.data
+
+        shards = []
+        for shard_path, ids, row_filter in self.shards.values():
+            rows = row_filter.rows(path, kind, file_type)
+            if rows is None or rows.size:
+                shards.append((shard_path, ids, rows))
+
+        pool = self._executor()
+        if pool is not None:
+            futures = [pool.submit(_score_shard, shard_path, q_indices, q_data, k, rows)
+                       for shard_path, _, rows in shards]
+            shard_hits = [f.result() for f in futures]
+        else:
+            shard_hits = [_score_shard(shard_path, q_indices, q_data, k, rows) for shard_path, _, rows in shards]
+
+        merged = heapq.nlargest(
+            k,
+            ((score, ids[row]) for (_, ids, _), hits in zip(shards, shard_hits) for row, score in hits),
+        )
+        return [(uid, score) for score, uid in merged]
+
+    def close(self):
+        """
+        Stop the worker pool and delete the shard files this instance created,
+        as soon as the queries currently running on it have finished.
+        """
+        with self._lock:
+            self._close_requested = True
+            release = self._active == 0 and not self._released
+            self._released = self._released or release
+        if release:
+            self._release()
+
+    def _release(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+            self.shards = {}
+        if pool is not None:
+            pool.shutdown()
+        _evict_shards(self.shard_dir)
+        if self._owns_dir:
+            shutil.rmtree(self.shard_dir, ignore_errors=True)
+            _owned_dirs.discard(str(self.shard_dir))
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
@@ -2,6 +2,8 @@ from fastapi import FastAPI, HTTPException
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from pathlib import Path
+from typing import List, Optional
+import os
 import sys
 
 # Add src to path
@@ -9,6 +11,8 @@ sys.path.append(str(Path(__file__).parent.parent.parent))
 
 from codelens.ast_indexer import index_repo
 from codelens.query_pipeline import QueryPipeline
+from codelens.index_store import IndexReader, current_generation, publish_index
+from codelens.llm import LLMClient
 from codelens.utils import load_json
 
 app = FastAPI()
@@ -16,19 +20,55 @@ app = FastAPI()
 # Global state
 pipeline = None
 current_repo_path = None  # Track which repo is currently indexed
+# One client per process, shared by every pipeline, so circuit breakers and
+# counters are not reset when the index is rebuilt or swapped
+llm_client = LLMClient()
+
+# Multi-worker mode: index artifacts live in a shared, memory-mapped store that
+# every uvicorn worker attaches to instead of holding its own copy
+SHARED_INDEX_DIR = os.environ.get("CODELENS_SHARED_INDEX")
+shared_reader = IndexReader(SHARED_INDEX_DIR) if SHARED_INDEX_DIR else None
+
+def _replace_pipeline(new_pipeline):
+    """Swap in a new pipeline and release the old one's worker pool and shard files."""
+    global pipeline
+    old, pipeline = pipeline, new_pipeline
+    if old is not None:
+        old.close()
+
+def _refresh_shared_pipeline():
+    """Swap to the latest published generation if another worker replaced it."""
+    global current_repo_path
+    if shared_reader and shared_reader.refresh():
+        _replace_pipeline(QueryPipeline.from_shared_index(shared_reader.index, llm=llm_client))
+        current_repo_path = shared_reader.index.meta.get("path")
 
 class QueryRequest(BaseModel):
     question: str
     k: int = 5
+    path: Optional[str] = None             # directory/file prefix or glob
+    kind: Optional[List[str]] = None       # e.g. ["function", "class"]
+    file_type: Optional[List[str]] = None  # e.g. ["py"]
 
 @app.on_event("startup")
 def startup_event():
     # Only load existing index if available, don't auto-index anything
     global pipeline, current_repo_path
     try:
-        if Path("index.json").exists():
+        if shared_reader:
+            if current_generation(SHARED_INDEX_DIR) is None and Path("index.json").exists():
+                # Only parse index.json when nothing is published yet; if several
+                # workers race here, the first to get the lock builds
+                publish_index(load_json("index.json"), SHARED_INDEX_DIR,
+                              meta={"path": "index.json (pre-existing)"}, if_missing=True)
+            _refresh_shared_pipeline()
+            if pipeline:
+                print(f"Attached to shared index {shared_reader.index.generation}")
+            else:
+                print("No index.json found. Please index a repository via the web UI.")
+        elif Path("index.json").exists():
             units = load_json("index.json")
-            pipeline = QueryPipeline(units)
+            _replace_pipeline(QueryPipeline(units, llm=llm_client))
             current_repo_path = "index.json (pre-existing)"
             print(f"Loaded {len(units)} units from existing index.json")
         else:
@@ -36,9 +76,12 @@ def startup_event():
     except Exception as e:
         print(f"Startup note: {e}")
 
+@app.on_event("shutdown")
+def shutdown_event():
+    _replace_pipeline(None)
+
 import subprocess
 import shutil
-import os
 
 @app.post("/index")
 def trigger_index(repo_path: str):
@@ -81,8 +124,13 @@ def trigger_index(repo_path: str):
     save_json(units, "index.json")
     
     # Update global pipeline
-    pipeline = QueryPipeline(units)
-    current_repo_path = repo_path
+    if shared_reader:
+        # Other workers pick up the new generation on their next request
+        publish_index(units, SHARED_INDEX_DIR, meta={"path": repo_path})
+        _refresh_shared_pipeline()
+    else:
+        _replace_pipeline(QueryPipeline(units, llm=llm_client))
+        current_repo_path = repo_path
     
     print(f"✅ Indexed {len(units)} units from: {repo_path}")
     
@@ -90,10 +138,16 @@ def trigger_index(repo_path: str):
 
 @app.post("/query")
 def query(req: QueryRequest):
+    _refresh_shared_pipeline()
     if not pipeline:
         raise HTTPException(status_code=500, detail="Index not ready")
     
-    result = pipeline.run(req.question, k=req.k)
+    result = pipeline.run(req.question, k=req.k, path=req.path, kind=req.kind, file_type=req.file_type)
     return result
 
+@app.get("/stats/llm")
+def llm_stats():
+    """Circuit breaker state per LLM provider and the offline fallback rate."""
+    return llm_client.stats()
+
 app.mount("/", StaticFiles(directory="src/web/static", html=True), name="static")
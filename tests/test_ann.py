@@ -0,0 +1,94 @@
+import random
+import numpy as np
+import pytest
+from codelens import retriever as retriever_module
+from codelens.ann import IVFIndex
+from codelens.retriever import ANN_MIN_UNITS, Retriever
+
+TOPICS = [
+    "parse config file yaml loader settings",
+    "http request retry backoff timeout client",
+    "cache eviction session store expiry",
+    "graph node edge traversal caller callee",
+    "queue event stream batch consumer",
+]
+
+def make_units(n, seed=0):
+    rng = random.Random(seed)
+    vocab = [f"tok{i}" for i in range(400)]
+    units = []
+    for i in range(n):
+        topic = TOPICS[i % len(TOPICS)].split()
+        words = rng.choices(topic, k=6) + rng.choices(vocab, k=10)
+        units.append({
+            "id": f"pkg{i % 7}/m.py::f{i}",
+            "file_path": f"pkg{i % 7}/m.py",
+            "name": f"f{i}",
+            "kind": "function",
+            "code": " ".join(words),
+            "docstring": "",
+        })
+    return units
+
+QUERIES = ["retry the http request", "cache session expiry tok5", "graph traversal tok17 tok42", "yaml settings"]
+
+@pytest.fixture
+def small_ann(monkeypatch):
+    monkeypatch.setattr(retriever_module, "ANN_MIN_UNITS", 100)
+    retriever = Retriever(mode="ann", n_probe=2)
+    retriever.index_units(make_units(300))
+    return retriever
+
+def test_full_probe_is_exact():
+    exact = Retriever(mode="exact")
+    exact.index_units(make_units(300))
+    index = IVFIndex(n_components=32, n_clusters=12, n_probe=12).build(exact.matrix)
+    assert sum(len(m) for m in index.members) == exact.matrix.shape[0]
+
+    for query in QUERIES:
+        query_vec = exact.vectorizer.transform([query])
+        hits = index.search(exact.matrix, query_vec, k=10, n_probe=index.n_clusters)
+        scores = (exact.matrix @ query_vec.T).toarray().ravel()
+        expected = np.sort(scores)[::-1][:10]
+        assert np.allclose([s for _, s in hits], expected)
+        assert all(np.isclose(scores[row], s) for row, s in hits)
+
+def test_candidates_grow_with_n_probe():
+    exact = Retriever(mode="exact")
+    exact.index_units(make_units(300))
+    index = IVFIndex(n_components=32, n_clusters=12).build(exact.matrix)
+    query_vec = exact.vectorizer.transform(["retry the http request"])
+    sizes = [index.candidates(query_vec, n_probe=p).size for p in (1, 4, 12)]
+    assert sizes == sorted(sizes) and sizes[-1] == exact.matrix.shape[0]
+
+def test_ann_retriever_uses_index(small_ann):
+    assert small_ann.ann_index is not None
+    hits = small_ann.query_top_k("retry the http request", k=5)
+    assert 0 < len(hits) <= 5
+    assert [s for _, s in hits] == sorted((s for _, s in hits), reverse=True)
+
+def test_ann_with_full_probe_matches_exact(small_ann):
+    small_ann.n_probe = small_ann.ann_index.n_clusters
+    for query in QUERIES:
+        ann = small_ann.query_top_k(query, k=8)
+        exact = small_ann.query_top_k(query, k=8, exact=True)
+        assert np.allclose([s for _, s in ann], [s for _, s in exact])
+
+def test_unknown_terms_return_nothing(small_ann):
+    assert small_ann.query_top_k("zzzz qqqq", k=5) == []
+    assert small_ann.query_top_k("", k=5) == []
+
+def test_scoped_queries_bypass_ann(small_ann):
+    hits = small_ann.query_top_k("retry the http request", k=5, path="pkg3")
+    assert hits and all(uid.startswith("pkg3/") for uid, _ in hits)
+
+def test_small_index_falls_back_to_exact():
+    units = make_units(ANN_MIN_UNITS - 1)
+    ann = Retriever(mode="ann")
+    ann.index_units(units)
+    assert ann.ann_index is None
+
+    exact = Retriever(mode="exact")
+    exact.index_units(units)
+    for query in QUERIES:
+        assert ann.query_top_k(query, k=5) == exact.query_top_k(query, k=5)
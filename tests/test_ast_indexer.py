@@ -0,0 +1,123 @@
+import logging
+import pytest
+from codelens.ast_indexer import (
+    CHUNK_MAX_CHARS, SPLIT_LINE_LENGTH, _chunk_ranges, _join_pieces, _split_long_lines,
+    index_repo, validate_chunking,
+)
+
+def units_by_file(units):
+    grouped = {}
+    for u in units:
+        grouped.setdefault(u["file_path"], []).append(u)
+    return grouped
+
+@pytest.mark.parametrize("chunk_lines, overlap", [(0, 0), (-5, 0), (10, 10), (10, 50), (10, -1)])
+def test_validate_chunking_rejects(chunk_lines, overlap):
+    with pytest.raises(ValueError):
+        validate_chunking(chunk_lines, overlap)
+
+@pytest.mark.parametrize("chunk_lines, overlap", [(1, 0), (10, 9), (120, 20)])
+def test_validate_chunking_accepts(chunk_lines, overlap):
+    validate_chunking(chunk_lines, overlap)
+
+def test_index_repo_validates_before_walking(tmp_path):
+    with pytest.raises(ValueError):
+        index_repo(str(tmp_path), chunk_lines=0)
+
+def test_small_file_is_one_range():
+    assert _chunk_ranges(["a"] * 10, ".txt", chunk_lines=10, overlap=2) == [(0, 10)]
+    assert _chunk_ranges([], ".txt") == [(0, 0)]
+
+def test_ranges_cover_file_with_overlap():
+    ranges = _chunk_ranges(["line"] * 250, ".txt", chunk_lines=100, overlap=10)
+    assert ranges == [(0, 100), (90, 190), (180, 250)]
+
+def test_markdown_cuts_at_heading_outside_fences():
+    lines = ["text"] * 70 + ["# Heading"] + ["text"] * 10 + ["```", "# not a heading", "```"] + ["text"] * 100
+    ranges = _chunk_ranges(lines, ".md", chunk_lines=100, overlap=0)
+    assert ranges[0] == (0, 70)
+    assert all(start != 82 for start, _ in ranges)
+
+def test_boundary_in_first_half_is_ignored():
+    lines = ["# H"] + ["text"] * 20 + ["# H"] + ["text"] * 200
+    assert _chunk_ranges(lines, ".md", chunk_lines=100, overlap=0)[0] == (0, 100)
+
+def test_java_cuts_between_class_members():
+    lines = ["public class Big {"]
+    for m in range(30):
+        lines += [f"    int m{m}() {{"] + ["        x++;"] * 8 + ["    }"]
+    lines.append("}")
+    for start, end in _chunk_ranges(lines, ".java", chunk_lines=120, overlap=0):
+        if end < len(lines):
+            assert lines[end - 1] == "    }"
+            assert lines[end].lstrip().startswith("int m")
+
+def test_js_prefers_top_level_blocks():
+    lines = []
+    for f in range(20):
+        lines += [f"function f{f}() {{", "  if (x) {", "    y();", "  }", "}"]
+    ranges = _chunk_ranges(lines, ".js", chunk_lines=32, overlap=0)
+    assert all(lines[end - 1] == "}" for _, end in ranges)
+
+def test_character_cap():
+    lines = ["x" * 900] * 100
+    ranges = _chunk_ranges(lines, ".txt", chunk_lines=120, overlap=20, max_chars=CHUNK_MAX_CHARS)
+    assert len(ranges) > 1
+    for start, end in ranges:
+        assert sum(len(line) + 1 for line in lines[start:end]) <= CHUNK_MAX_CHARS
+    assert ranges[-1][1] == 100
+    # The overlap is capped at half a shortened window, so windows keep advancing
+    assert all(b[0] - a[0] >= (a[1] - a[0]) // 2 for a, b in zip(ranges, ranges[1:]))
+
+def test_single_line_over_cap_is_kept_whole():
+    assert _chunk_ranges(["x" * 50, "y" * 500, "z"], ".txt", chunk_lines=10, overlap=0, max_chars=100) == \
+        [(0, 1), (1, 2), (2, 3)]
+
+def test_split_long_lines_round_trips():
+    lines = ["short", "word " * 500, "", "x" * 2500]
+    pieces, numbers = _split_long_lines(lines)
+    assert all(len(p) <= SPLIT_LINE_LENGTH for p in pieces)
+    assert numbers[0] == 1 and numbers[-1] == 4
+    assert sorted(numbers) == numbers
+    assert _join_pieces(pieces, numbers) == "\n".join(lines)
+    # Prose is cut after a space, not mid-word; a line without spaces is cut at the limit
+    prose = [p for p, n in zip(pieces, numbers) if n == 2]
+    assert len(prose) == 3 and all(p.endswith(" ") for p in prose)
+    assert [len(p) for p, n in zip(pieces, numbers) if n == 4] == [1000, 1000, 500]
+
+def test_join_pieces_of_a_window():
+    pieces, numbers = _split_long_lines(["a" * 1500, "b"], limit=1000)
+    assert _join_pieces(pieces[1:], numbers[1:]) == "a" * 500 + "\nb"
+
+def test_guards(tmp_path, caplog):
+    (tmp_path / "ok.md").write_text("# Title\n\nSome prose.\n")
+    (tmp_path / "big.txt").write_text("x\n" * 1000)
+    (tmp_path / "blob.txt").write_bytes(b"abc\x00def")
+    (tmp_path / "latin.txt").write_bytes("caf\xe9\n".encode("latin-1"))
+    (tmp_path / "bundle.js").write_text("var a=1;" * 100)
+    (tmp_path / "wide.md").write_text("word " * 150 + "\n")  # prose is never "minified"
+    (tmp_path / "image.png").write_bytes(b"\x89PNG")
+    (tmp_path / "large.py").write_text("def f():\n    return 1\n" + "# pad\n" * 500)
+
+    with caplog.at_level(logging.INFO, logger="codelens"):
+        units = units_by_file(index_repo(str(tmp_path), max_file_size=1000))
+
+    assert set(units) == {"ok.md", "wide.md", "large.py"}
+    assert units["large.py"][0]["kind"] == "function"
+    assert "(0 files chunked, 4 files skipped)" in caplog.text
+    assert "latin.txt: not valid UTF-8" in caplog.text
+    assert "bundle.js: looks minified" in caplog.text
+    assert "blob.txt: looks binary" in caplog.text
+    assert not [r for r in caplog.records if r.levelno >= logging.ERROR]
+
+def test_chunk_units_have_unique_ids_and_bounded_code(tmp_path):
+    (tmp_path / "huge.txt").write_text("word " * 60000)
+    (tmp_path / "gen.java").write_text("class G {\n" + ("  int[] a = {" + ",".join(["1"] * 3000) + "};\n") * 10 + "}\n")
+    units = index_repo(str(tmp_path))
+
+    assert len({u["id"] for u in units}) == len(units)
+    assert all(u["kind"] == "chunk" for u in units)
+    assert max(len(u["code"]) for u in units) <= CHUNK_MAX_CHARS
+    huge = [u for u in units if u["file_path"] == "huge.txt"]
+    assert all(u["start_line"] == u["end_line"] == 1 for u in huge)
+    assert huge[0]["id"] == "huge.txt#L1-L1"
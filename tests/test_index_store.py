@@ -0,0 +1,143 @@
+import random
+import numpy as np
+import pytest
+from sklearn.feature_extraction.text import TfidfVectorizer
+from codelens.graph_builder import GraphBuilder
+from codelens.index_store import (
+    KEEP_GENERATIONS, IndexReader, MappedVectorizer, SharedIndex, _save_vectorizer,
+    current_generation, publish_index,
+)
+from codelens.retriever import Retriever
+
+CORPUS = [
+    "def load_config(path): return parse(read(path))",
+    "class SessionCache: caches sessions and evicts stale ones",
+    "Café naïve résumé: unicode tokens ÜBER straße",
+    "retry retry retry the request until the queue drains",
+    "graph edges connect callers to callees in the call graph",
+]
+QUERIES = [
+    "how is the config loaded",
+    "retry the request retry",
+    "RÉSUMÉ café",
+    "nothing here matches zzzz",
+    "",
+    "graph graph edges callers",
+]
+
+def make_units(n=40, seed=0):
+    rng = random.Random(seed)
+    units = []
+    for i in range(n):
+        calls = [f"f{j}" for j in rng.sample(range(n), 3)]
+        units.append({
+            "id": f"pkg{i % 4}/mod{i % 3}.py::f{i}",
+            "file_path": f"pkg{i % 4}/mod{i % 3}.py",
+            "name": f"f{i}",
+            "kind": "function" if i % 5 else "class",
+            "code": f"def f{i}(): " + " ".join(f"{c}()" for c in calls) + f" # {CORPUS[i % len(CORPUS)]}",
+            "docstring": "",
+            "calls": calls,
+        })
+    return units
+
+@pytest.fixture
+def shared(tmp_path):
+    units = make_units()
+    publish_index(units, tmp_path)
+    reader = IndexReader(tmp_path)
+    assert reader.refresh()
+    return units, reader.index
+
+@pytest.mark.parametrize("params", [
+    {"stop_words": "english"},
+    {"sublinear_tf": True},
+    {"binary": True},
+    {"use_idf": False},
+    {"norm": "l1", "smooth_idf": False},
+    {"norm": None, "sublinear_tf": True},
+])
+def test_mapped_vectorizer_matches_sklearn(tmp_path, params):
+    vectorizer = TfidfVectorizer(**params).fit(CORPUS)
+    _save_vectorizer(tmp_path, vectorizer)
+    mapped = MappedVectorizer(tmp_path)
+
+    expected = vectorizer.transform(QUERIES + CORPUS)
+    got = mapped.transform(QUERIES + CORPUS)
+    assert got.shape == expected.shape
+    assert (got.indptr == expected.indptr).all()
+    for row in range(expected.shape[0]):
+        e, g = expected[row], got[row]
+        assert sorted(e.indices.tolist()) == g.indices.tolist()
+        assert np.allclose(e.toarray(), g.toarray(), rtol=0, atol=1e-12)
+
+def test_mapped_terms_are_column_order(tmp_path):
+    vectorizer = TfidfVectorizer().fit(CORPUS)
+    _save_vectorizer(tmp_path, vectorizer)
+    mapped = MappedVectorizer(tmp_path)
+    assert list(mapped.terms) == list(vectorizer.get_feature_names_out())
+    assert mapped.terms.find("retry") == vectorizer.vocabulary_["retry"]
+    assert mapped.terms.find("not-a-term") == -1
+    assert mapped.terms.find("") == -1
+
+def test_unit_store(shared):
+    units, index = shared
+    store = index.units
+    assert len(store) == len(units)
+    assert list(store) == units
+    for row, unit in enumerate(units):
+        assert store.row_of(unit["id"]) == row
+        assert store[unit["id"]] == unit
+        assert store[np.int64(row)] == unit
+        assert store.ids[row] == unit["id"]
+    assert store.row_of("missing") == -1
+    assert "missing" not in store and units[3]["id"] in store
+    with pytest.raises(KeyError):
+        store["missing"]
+
+def test_graph_arrays_match_graph_builder(shared):
+    units, index = shared
+    builder = GraphBuilder(units)
+    builder.build()
+    ids = [u["id"] for u in units]
+    rng = random.Random(1)
+    for _ in range(30):
+        sample = rng.sample(ids, 5) + ["missing::id"]
+        assert sorted(u["id"] for u in index.graph.get_context_neighbors(sample)) == \
+            sorted(u["id"] for u in builder.get_context_neighbors(sample))
+        assert sorted(index.graph.edges_within(sample)) == sorted(builder.edges_within(sample))
+
+def test_shared_retriever_matches_in_memory(shared):
+    units, index = shared
+    retriever = Retriever(mode="exact")
+    retriever.index_units(units)
+    for query in QUERIES:
+        assert index.retriever.query_top_k(query, k=5) == retriever.query_top_k(query, k=5)
+        assert index.retriever.query_top_k(query, k=5, path="pkg1", kind="class") == \
+            retriever.query_top_k(query, k=5, path="pkg1", kind="class")
+
+def test_generations_are_pruned(tmp_path):
+    reader = IndexReader(tmp_path)
+    assert current_generation(tmp_path) is None
+    assert not reader.refresh()
+
+    names = [publish_index(make_units(seed=s), tmp_path, meta={"seed": s}) for s in range(4)]
+    assert names == [f"gen-{n:06d}" for n in range(1, 5)]
+    assert current_generation(tmp_path) == names[-1]
+    assert sorted(p.name for p in tmp_path.glob("gen-*")) == names[-KEEP_GENERATIONS:]
+    assert not list(tmp_path.glob(".tmp-*"))
+
+    assert reader.refresh()
+    assert reader.index.generation == names[-1] and reader.index.meta["seed"] == 3
+    assert not reader.refresh()
+
+def test_publish_if_missing_keeps_existing(tmp_path):
+    first = publish_index(make_units(), tmp_path)
+    assert publish_index(make_units(seed=9), tmp_path, if_missing=True) == first
+    assert sorted(p.name for p in tmp_path.glob("gen-*")) == [first]
+
+def test_empty_index(tmp_path):
+    name = publish_index([], tmp_path)
+    index = SharedIndex(tmp_path, name)
+    assert len(index.units) == 0
+    assert index.retriever.query_top_k("anything") == []
@@ -0,0 +1,158 @@
+import time
+import pytest
+from stub_llm import start_stub_llm
+from codelens.llm import CircuitBreaker, LLMClient
+
+ROUTING_ENV = ("LLM_PROVIDER", "LLM_FALLBACK_PROVIDERS", "LLM_LATENCY_BUDGET", "LLM_PROVIDER_TIMEOUT",
+               "LLM_HEDGE_DELAY", "LLM_BREAKER_FAILURES", "LLM_BREAKER_RESET",
+               "HUGGINGFACE_API_KEY", "HF_TOKEN", "HUGGINGFACE_API_URL", "OPENAI_API_KEY", "OPENAI_BASE_URL")
+
+@pytest.fixture
+def stub():
+    servers = []
+
+    def start(**kwargs):
+        server, url = start_stub_llm(**kwargs)
+        servers.append(server)
+        return server, url
+
+    yield start
+    for server in servers:
+        server.shutdown()
+
+@pytest.fixture
+def make_client(monkeypatch):
+    def make(hf_url=None, openai_url=None, **env):
+        for name in ROUTING_ENV:
+            monkeypatch.delenv(name, raising=False)
+        providers = []
+        if hf_url:
+            providers.append("huggingface")
+            monkeypatch.setenv("HUGGINGFACE_API_KEY", "test")
+            monkeypatch.setenv("HUGGINGFACE_API_URL", hf_url)
+        if openai_url:
+            providers.append("openai")
+            monkeypatch.setenv("OPENAI_API_KEY", "test")
+            monkeypatch.setenv("OPENAI_BASE_URL", openai_url)
+        monkeypatch.setenv("LLM_PROVIDER", providers[0] if providers else "none")
+        monkeypatch.setenv("LLM_FALLBACK_PROVIDERS", ",".join(providers[1:]))
+        for name, value in env.items():
+            monkeypatch.setenv(name, str(value))
+        return LLMClient()
+    return make
+
+def ask(client):
+    start = time.monotonic()
+    answer = client.generate_answer("what does f do?", [{"id": "a.py::f", "code": "def f(): pass"}], [])
+    return answer, time.monotonic() - start
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker("p", failure_threshold=2, reset_timeout=60)
+    breaker.record_failure("boom", 0.1)
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record_failure("boom", 0.1)
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    assert breaker.snapshot()["skipped"] == 1
+
+def test_breaker_half_open_lets_one_trial_through():
+    breaker = CircuitBreaker("p", failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure("boom", 0.1)
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    assert not breaker.allow()  # trial already in flight
+    breaker.record_failure("still down", 0.1)
+    assert breaker.state == "open"
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success(0.1)
+    assert breaker.state == "closed" and breaker.consecutive_failures == 0
+
+def test_open_breaker_skips_provider(stub, make_client):
+    server, url = stub(latency=0.0, error_rate=1.0)
+    client = make_client(hf_url=url, LLM_BREAKER_FAILURES=2, LLM_BREAKER_RESET=60)
+
+    for _ in range(2):
+        answer, _ = ask(client)
+        assert answer["provider"].startswith("Offline Analysis")
+    assert client.breakers["huggingface"].state == "open"
+
+    answer, _ = ask(client)
+    assert answer["provider"].startswith("Offline Analysis")
+    assert server.requests_received == 2
+    assert client.breakers["huggingface"].skipped == 1
+
+def test_half_open_recovery(stub, make_client):
+    _, failing_url = stub(latency=0.0, error_rate=1.0)
+    healthy, healthy_url = stub(latency=0.0)
+    client = make_client(hf_url=failing_url, LLM_BREAKER_FAILURES=1, LLM_BREAKER_RESET=0.1)
+
+    ask(client)
+    assert client.breakers["huggingface"].state == "open"
+
+    client.hf_api_url = healthy_url  # the provider comes back
+    answer, _ = ask(client)
+    assert answer["provider"].startswith("Offline Analysis")  # still within reset_timeout
+    assert healthy.requests_received == 0
+
+    time.sleep(0.15)
+    answer, _ = ask(client)
+    assert answer["provider"].startswith("Hugging Face")
+    assert client.breakers["huggingface"].state == "closed"
+    assert healthy.requests_received == 1
+
+def test_budget_exhaustion_falls_back_to_offline(stub, make_client):
+    _, url = stub(latency=1.0)
+    client = make_client(hf_url=url, LLM_LATENCY_BUDGET=0.3)
+
+    answer, elapsed = ask(client)
+    assert answer["provider"].startswith("Offline Analysis")
+    assert elapsed < 0.8
+    snapshot = client.breakers["huggingface"].snapshot()
+    assert snapshot["failures"] == 1
+    assert "exceeded" in snapshot["last_error"]
+
+def test_slow_primary_fails_over_within_budget(stub, make_client):
+    _, slow_url = stub(latency=3.0)
+    _, fast_url = stub(latency=0.05)
+    client = make_client(hf_url=slow_url, openai_url=fast_url, LLM_LATENCY_BUDGET=1, LLM_HEDGE_DELAY=0)
+
+    answer, elapsed = ask(client)
+    assert answer["provider"] == "OpenAI"
+    assert elapsed < 1.0
+    assert client.breakers["huggingface"].last_error == "provider timeout exceeded"
+
+def test_hedge_wins_over_slow_primary(stub, make_client):
+    _, slow_url = stub(latency=1.5)
+    _, fast_url = stub(latency=0.05)
+    client = make_client(hf_url=slow_url, openai_url=fast_url, LLM_LATENCY_BUDGET=5, LLM_HEDGE_DELAY=0.1)
+
+    answer, elapsed = ask(client)
+    assert answer["provider"] == "OpenAI"
+    assert elapsed < 1.0
+    assert client.stats()["hedges"] == 1
+
+def test_stats(stub, make_client):
+    _, url = stub(latency=0.0, error_rate=1.0)
+    client = make_client(hf_url=url, LLM_LATENCY_BUDGET=2, LLM_BREAKER_FAILURES=5)
+    ask(client)
+    ask(client)
+
+    stats = client.stats()
+    assert stats["requests"] == 2
+    assert stats["fallbacks"] == 2
+    assert stats["fallback_rate"] == 1.0
+    assert stats["hedges"] == 0
+    assert stats["latency_budget"] == 2.0
+    provider = stats["providers"]["huggingface"]
+    assert provider["state"] == "closed"
+    assert provider["failures"] == 2 and provider["consecutive_failures"] == 2
+
+def test_stats_without_providers(make_client):
+    client = make_client()
+    ask(client)
+    stats = client.stats()
+    assert stats["providers"] == {}
+    assert stats["requests"] == 1 and stats["fallback_rate"] == 1.0
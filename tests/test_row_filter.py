@@ -0,0 +1,135 @@
+import numpy as np
+import pytest
+from codelens.index_store import IndexReader, publish_index
+from codelens.retriever import Retriever, RowFilter
+from codelens.sharded_retriever import ShardedRetriever
+
+PATHS = [
+    "src/api/routes.py",       # 0
+    "src/api2/routes.py",      # 1
+    "src/api/v1/users.py",     # 2
+    "src/api",                 # 3  a file named like the directory
+    "src/api-old/x.py",        # 4  sorts between "src/api" and "src/api/"
+    "src/api/\U0010fffdz.md",  # 5  code point just below the range sentinel
+    "docs/api.md",             # 6
+    "src/api/routes.py",       # 7  second unit in the same file
+]
+KINDS = ["function", "function", "class", "file", "function", "chunk", "file", "class"]
+
+@pytest.fixture
+def row_filter():
+    return RowFilter(PATHS, KINDS)
+
+def rows(row_filter, **kwargs):
+    result = row_filter.rows(**kwargs)
+    return None if result is None else result.tolist()
+
+def test_no_filter_returns_none(row_filter):
+    assert row_filter.rows() is None
+    assert row_filter.rows(path="", kind=[], file_type=[]) is None
+
+def test_directory_prefix_excludes_sibling_with_same_prefix(row_filter):
+    assert rows(row_filter, path="src/api") == [0, 2, 3, 5, 7]
+    assert 1 not in rows(row_filter, path="src/api")
+    assert 4 not in rows(row_filter, path="src/api")
+
+def test_prefix_variants_are_equivalent(row_filter):
+    expected = rows(row_filter, path="src/api")
+    assert rows(row_filter, path="src/api/") == expected
+    assert rows(row_filter, path="./src/api") == expected
+    assert rows(row_filter, path=" src/api ") == expected
+
+def test_exact_file(row_filter):
+    assert rows(row_filter, path="src/api/routes.py") == [0, 7]
+    assert rows(row_filter, path="src/api/v1/users.py") == [2]
+    assert rows(row_filter, path="src/api/routes") == []
+
+def test_root_prefix_matches_everything(row_filter):
+    assert rows(row_filter, path="/") == list(range(len(PATHS)))
+
+def test_glob(row_filter):
+    assert rows(row_filter, path="src/*/routes.py") == [0, 1, 7]
+    assert rows(row_filter, path="*.md") == [5, 6]
+    assert rows(row_filter, path="nowhere/*") == []
+
+def test_kind_and_file_type(row_filter):
+    assert rows(row_filter, kind="class") == [2, 7]
+    assert rows(row_filter, kind=["class", "file"]) == [2, 3, 6, 7]
+    assert rows(row_filter, file_type="md") == [5, 6]
+    assert rows(row_filter, file_type=[".PY"]) == [0, 1, 2, 4, 7]
+    assert rows(row_filter, kind="unknown") == []
+
+def test_filters_intersect(row_filter):
+    assert rows(row_filter, path="src/api", kind="class") == [2, 7]
+    assert rows(row_filter, path="src/api", kind=["function", "chunk"], file_type="md") == [5]
+    assert rows(row_filter, path="docs", kind="class") == []
+
+def test_cache_hits_and_evicts():
+    row_filter = RowFilter(PATHS, KINDS, cache_size=2)
+    first = row_filter.rows(path="src/api")
+    assert row_filter.rows(path="src/api") is first
+    # Kind order does not change the cache key
+    assert row_filter.rows(kind=["file", "class"]) is row_filter.rows(kind=["class", "file"])
+
+    row_filter.rows(file_type="md")
+    assert len(row_filter._cache) == 2
+    assert row_filter.rows(path="src/api") is not first
+    assert row_filter.rows(path="src/api").tolist() == first.tolist()
+
+def test_from_arrays_matches(row_filter):
+    rebuilt = RowFilter.from_arrays(row_filter.order, row_filter.sorted_paths, row_filter.file_starts,
+                                    row_filter.by_kind, row_filter.by_ext)
+    for kwargs in ({"path": "src/api"}, {"path": "*.py"}, {"kind": "class", "file_type": "py"}):
+        assert rows(rebuilt, **kwargs) == rows(row_filter, **kwargs)
+
+def make_units():
+    units = []
+    for i, path in enumerate(PATHS * 3):
+        units.append({
+            "id": f"{path}::unit_{i}",
+            "file_path": path,
+            "name": f"unit_{i}",
+            "kind": KINDS[i % len(KINDS)],
+            "code": f"def unit_{i}(): return parse_request(payload)",
+            "docstring": "",
+            "calls": [],
+        })
+    return units
+
+def test_memory_mapped_filter_matches(tmp_path, row_filter):
+    units = make_units()
+    publish_index(units, tmp_path)
+    reader = IndexReader(tmp_path)
+    reader.refresh()
+    mapped = reader.index.retriever.row_filter
+    expected = RowFilter([u["file_path"] for u in units], [u["kind"] for u in units])
+    for kwargs in ({"path": "src/api"}, {"path": "./src/api/routes.py"}, {"path": "src/*/routes.py"},
+                   {"kind": ["class", "chunk"], "file_type": "md"}, {"path": "src", "file_type": "py"}):
+        assert rows(mapped, **kwargs) == rows(expected, **kwargs)
+    assert isinstance(mapped.order, np.memmap)
+
+def test_scoped_query_returns_full_k():
+    units = make_units()
+    retriever = Retriever(mode="exact")
+    retriever.index_units(units)
+
+    # 15 of the 24 units are under src/api; an unscoped top-k would mix in the rest
+    hits = retriever.query_top_k("parse request payload", k=10, path="src/api")
+    assert len(hits) == 10
+    allowed = {u["id"] for u in units if u["file_path"] == "src/api" or u["file_path"].startswith("src/api/")}
+    assert {uid for uid, _ in hits} <= allowed
+    assert retriever.query_top_k("parse request payload", k=4, path="nowhere") == []
+
+def test_sharded_retriever_applies_the_same_filters():
+    units = make_units()
+    exact = Retriever(mode="exact")
+    exact.index_units(units)
+    sharded = ShardedRetriever(workers=0)
+    try:
+        sharded.index_units(units)
+        for kwargs in ({"path": "src/api"}, {"path": "*.md"}, {"kind": "class", "file_type": "py"}):
+            expected = exact.query_top_k("parse request payload", k=len(units), **kwargs)
+            got = sharded.query_top_k("parse request payload", k=len(units), **kwargs)
+            assert sorted(uid for uid, _ in got) == sorted(uid for uid, _ in expected)
+    finally:
+        sharded.close()
@@ -0,0 +1,99 @@
+import threading
+from codelens import sharded_retriever
+from codelens.retriever import Retriever
+from codelens.sharded_retriever import ShardedRetriever
+
+def make_units(packages=4, per_package=30):
+    units = []
+    for p in range(packages):
+        for i in range(per_package):
+            units.append({
+                "id": f"pkg{p}/mod.py::f_{p}_{i}",
+                "file_path": f"pkg{p}/mod.py",
+                "name": f"f_{p}_{i}",
+                "kind": "function",
+                "code": f"def f_{p}_{i}(): return load_{i % 7}(session_{p}, request_{i % 5})",
+                "docstring": "",
+                "calls": [],
+            })
+    return units
+
+def cached_paths(retriever):
+    prefix = str(retriever.shard_dir)
+    return [path for path, _ in sharded_retriever._worker_cache.values() if path.startswith(prefix)]
+
+def test_process_pool_matches_exact():
+    units = make_units()
+    exact = Retriever(mode="exact")
+    exact.index_units(units)
+    sharded = ShardedRetriever(workers=2)
+    try:
+        sharded.index_units(units)
+        for query in ("load_3 session_1 request_2", "f_2_3 load_3"):
+            expected = dict(exact.query_top_k(query, k=len(units)))
+            got = sharded.query_top_k(query, k=10)
+            assert len(got) == 10
+            # Ties may be broken differently; scores must agree with the exact path
+            assert all(abs(expected[uid] - score) < 1e-9 for uid, score in got)
+            assert [round(s, 9) for _, s in got] == sorted((round(s, 9) for s in expected.values()), reverse=True)[:10]
+        assert sharded._pool is not None
+    finally:
+        sharded.close()
+    assert sharded._pool is None
+    assert not sharded.shard_dir.exists()
+
+def test_close_waits_for_running_queries():
+    sharded = ShardedRetriever(workers=2)
+    sharded.index_units(make_units())
+    errors, started, stop = [], threading.Barrier(5), threading.Event()
+
+    def hammer():
+        started.wait()
+        while not stop.is_set():
+            try:
+                sharded.query_top_k("load_3 session_1 request_2", k=5)
+            except Exception as e:  # noqa: BLE001 - any error fails the test
+                errors.append(e)
+                return
+
+    threads = [threading.Thread(target=hammer) for _ in range(4)]
+    for t in threads:
+        t.start()
+    started.wait()
+    sharded.close()
+    stop.set()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    assert sharded.shards == {}
+    assert sharded._pool is None
+    assert not sharded.shard_dir.exists()
+
+def test_queries_after_close_return_nothing_and_start_no_pool():
+    sharded = ShardedRetriever(workers=2)
+    sharded.index_units(make_units())
+    sharded.close()
+    assert sharded.query_top_k("load_3 session_1", k=5) == []
+    assert sharded._pool is None
+    sharded.close()  # idempotent
+
+def test_close_evicts_in_process_cache():
+    sharded = ShardedRetriever(workers=0)
+    sharded.index_units(make_units())
+    assert sharded.query_top_k("load_3 session_1 request_2", k=5)
+    assert len(cached_paths(sharded)) == len(sharded.shards)
+
+    sharded.close()
+    assert cached_paths(sharded) == []
+
+def test_shard_dir_from_environment(tmp_path, monkeypatch):
+    monkeypatch.setenv("RETRIEVAL_SHARD_DIR", str(tmp_path / "shards"))
+    sharded = ShardedRetriever(workers=0)
+    sharded.index_units(make_units(packages=2, per_package=3))
+    assert sharded.shard_dir.parent == tmp_path / "shards"
+    assert str(sharded.shard_dir) in sharded_retriever._owned_dirs
+
+    sharded.close()
+    assert list((tmp_path / "shards").iterdir()) == []
+    assert str(sharded.shard_dir) not in sharded_retriever._owned_dirs